@@ -1,7 +1,16 @@
 import logging
+import os
 
-from ._orchestrator import _NumberOrchestrator
+from ._orchestrator import _NumberOrchestrator, CONFLICT_POLICIES
+from ._view import _ViewOrchestrator, VIEW_MODES
 from .metadata import FnumMetadata, FnumMax
+from .result import FnumResult
+from .session import NumberSession
+from .trace import Tracer
+from .fs import OsFilesystem
+from .lock import FileLock, _run_locked
+from .verify import verify_metadata, repair_metadata, FnumIssue
+from .query import iter_entries, lookup_entries, get_stats
 
 
 __version__ = "1.6.0"
@@ -10,17 +19,61 @@ _log = logging.getLogger(__name__)
 
 
 def number_files(
-    dirpath, suffixes, write_metadata=False, write_max=False, include_imeta=False
+    dirpath,
+    suffixes,
+    write_metadata=False,
+    write_max=False,
+    include_imeta=False,
+    on_conflict="error",
+    tracer=None,
+    lock=None,
+    merge=False,
+    fs=None,
 ):
-    _log.info("Analyzing files...")
-    orchestrator = _NumberOrchestrator(
-        dirpath, suffixes, write_metadata, write_max, include_imeta
-    )
-    orchestrator.find_ordered()
-    orchestrator.find_movable()
+    def run():
+        orchestrator = _NumberOrchestrator(
+            dirpath,
+            suffixes,
+            write_metadata,
+            write_max,
+            include_imeta,
+            on_conflict,
+            tracer=tracer,
+            fs=fs,
+        )
+        return orchestrator.run()
+
+    merge_key = None
+    if merge:
+        merge_key = (
+            os.path.abspath(dirpath),
+            tuple(suffixes),
+            write_metadata,
+            write_max,
+            include_imeta,
+            on_conflict,
+        )
+    return _run_locked(dirpath, run, lock, merge_key)
 
-    _log.info("Processing files...")
-    orchestrator.move_numbered()
-    orchestrator.move_new()
 
-    orchestrator.maybe_write_metadata()
+def view_files(
+    dirpath,
+    viewpath,
+    suffixes,
+    mode="hardlink",
+    include_imeta=False,
+    on_conflict="error",
+    tracer=None,
+    fs=None,
+):
+    orchestrator = _ViewOrchestrator(
+        dirpath,
+        viewpath,
+        suffixes,
+        mode,
+        include_imeta,
+        on_conflict,
+        tracer=tracer,
+        fs=fs,
+    )
+    return orchestrator.run()
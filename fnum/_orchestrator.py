@@ -2,8 +2,26 @@ import logging
 from pathlib import Path
 from imeta import ImageMetadata
 
-from .exceptions import FnumException
-from .metadata import FnumMetadata
+from .exceptions import (
+    FnumException,
+    FnumConflictException,
+    FnumOverwriteException,
+)
+from .metadata import FnumMetadata, FnumMax
+from .fs import OS_FILESYSTEM
+from .result import FnumResult
+from .trace import NULL_TRACER
+
+
+# How to handle several files sharing a number with different suffixes:
+# error    - raise FnumConflictException listing every conflict
+# priority - the suffix listed first keeps the number
+# newest   - the most recently modified file keeps the number
+# append   - none of them keep the number
+# Files that don't keep their number are renamed after all new files.
+CONFLICT_POLICIES = ("error", "priority", "newest", "append")
+# Conflicting files are renamed with this prefix while the others move
+_STASH_PREFIX = ".fnum-"
 
 
 class NumRange:
@@ -91,10 +109,35 @@ class _NumberOrchestrator:
     unordered_files = None
     new_files = None
     removed_files = None
+    index = None
+    deferred_files = None
+    deferred_names = None
+    stashed_names = None
+    order_indexes = None
+    original_keys = None
+    stashes = None
+    moves = None
+    renames = None
+    added_files = None
 
     log = None
 
-    def __init__(self, dirpath, suffixes, write_metadata, write_max, include_imeta):
+    def __init__(
+        self,
+        dirpath,
+        suffixes,
+        write_metadata,
+        write_max,
+        include_imeta,
+        on_conflict="error",
+        metadata=None,
+        index=None,
+        tracer=None,
+        fs=None,
+        load_metadata=True,
+    ):
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy {on_conflict}")
         self.log = logging.getLogger(__name__)
 
         self.dirpath = Path(dirpath)
@@ -102,59 +145,200 @@ class _NumberOrchestrator:
         self.write_metadata = write_metadata
         self.write_max = write_max
         self.include_imeta = include_imeta
-
-        try:
-            self.metadata = FnumMetadata.from_file(dirpath)
-        except FileNotFoundError:
+        self.on_conflict = on_conflict
+        self.renames = []
+        self.added_files = []
+        self.index = index
+        self.tracer = tracer or NULL_TRACER
+        self.fs = fs or OS_FILESYSTEM
+
+        # Callers that already looked for the metadata file pass what they found
+        if metadata is None and load_metadata:
+            try:
+                metadata = FnumMetadata.from_file(dirpath, self.fs)
+            except FileNotFoundError:
+                pass
+        self.metadata = metadata
+        if self.metadata is None:
             if self.write_metadata or self.write_max:
                 self.metadata = FnumMetadata.get_default()
                 self.regen_meta = True
 
+    def numname(self, suffix):
+        return str(self.num) + suffix
+
     def numpath(self, suffix):
-        return self.dirpath / (str(self.num) + suffix)
+        return self.dirpath / self.numname(suffix)
+
+    def is_candidate(self, name):
+        return name in self.index and name not in self.deferred_names
 
-    def move_file(self, filepath):
-        newpath = self.numpath(filepath.suffix)
-        self.log.debug(f"Renaming {filepath.name} to {newpath.name}")
-        if newpath.exists():
+    def metapath(self, filepath):
+        return Path(ImageMetadata.for_image(str(filepath)))
+
+    def rename(self, filepath, newpath):
+        try:
+            self.fs.rename_noreplace(filepath, newpath)
+        except FileExistsError:
             raise FnumException(
                 f"Can't override existing file {newpath.name} while renaming {filepath.name}"
             )
+        self.reindex(filepath, newpath)
+
+    def move_file(self, filepath, newpath):
+        name = self.stashed_names.get(filepath.name, filepath.name)
 
         if self.metadata:
+            with self.tracer.span("metadata update", file=name):
+                self.update_metadata(filepath.name, newpath.name)
+
+        if newpath == filepath:
+            return
+        self.log.debug(f"Renaming {name} to {newpath.name}")
+        with self.tracer.span("rename", file=name):
+            self.rename(filepath, newpath)
+        if self.include_imeta:
+            metapath = self.metapath(filepath)
+            # Sidecars replace stale ones left behind by removed files, as before
+            if metapath.name in self.index:
+                newmetapath = metapath.parents[0] / f"{newpath.stem}{metapath.suffix}"
+                with self.tracer.span("sidecar rename", file=metapath.name):
+                    self.fs.rename(metapath, newmetapath)
+                self.reindex(metapath, newmetapath)
+        self.renames.append((name, newpath.name))
+
+    def update_metadata(self, name, newname):
+        order = self.metadata.order
+        order_index = self.order_indexes.pop(name, None)
+        if order_index is None:
+            order_index = len(order)
+            order.append(newname)
+        else:
+            order[order_index] = newname
+        self.order_indexes[newname] = min(
+            order_index, self.order_indexes.get(newname, order_index)
+        )
+
+        originals = self.metadata.originals
+        original_key = self.original_keys.pop(name, name)
+        replaced = originals.get(original_key)
+        if replaced is not None and self.original_keys.get(replaced) == original_key:
+            del self.original_keys[replaced]
+        originals[original_key] = newname
+        self.original_keys.setdefault(newname, original_key)
+
+    def rekey_metadata(self, name, newname):
+        # Stashed files are tracked under their stash name, so a file moved
+        # into the name they gave up doesn't take over their metadata
+        order_index = self.order_indexes.pop(name, None)
+        if order_index is not None:
+            self.order_indexes[newname] = order_index
+        self.original_keys[newname] = self.original_keys.pop(name, name)
+
+    def reindex(self, oldpath, newpath):
+        self.index.pop(oldpath.name, None)
+        self.index[newpath.name] = newpath
+
+    def mtime(self, filepath):
+        with self.tracer.span("stat", file=filepath.name):
+            return self.fs.stat(filepath).st_mtime_ns
+
+    def scan(self):
+        # Index the directory once so later steps don't need to stat each name
+        self.index = {}
+        with self.tracer.span("scan", dirpath=str(self.dirpath)):
+            with self.fs.scandir(self.dirpath) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        self.index[entry.name] = self.dirpath / entry.name
+
+    def stashpath(self, filepath):
+        return filepath.with_name(f"{_STASH_PREFIX}{filepath.name}")
+
+    def defer(self, filepath):
+        self.deferred_files.append(filepath)
+        self.deferred_names.add(filepath.name)
+        self.deferred_names.add(self.stashpath(filepath).name)
+
+    def find_stashed(self):
+        # Files stashed by a run that stopped partway are deferred again under
+        # their original names, so metadata keeps tracking them
+        stashed = []
+        for name in self.index:
+            if not name.startswith(_STASH_PREFIX):
+                continue
+            filepath = self.dirpath / name[len(_STASH_PREFIX) :]
+            if filepath.suffix not in self.suffixes or not filepath.stem.isdecimal():
+                continue
+            if filepath.name in self.index:
+                raise FnumException(
+                    f"Can't restore {name} left by an interrupted run, {filepath.name} already exists"
+                )
+            stashed.append(filepath)
+        stashed.sort(
+            key=lambda filepath: (
+                int(filepath.stem),
+                self.suffixes.index(filepath.suffix),
+            )
+        )
+        for filepath in stashed:
+            self.log.debug(f"Found {filepath.name} stashed by an earlier run")
+            self.defer(filepath)
+
+    def resolve_conflicts(self):
+        self.deferred_files = []
+        self.deferred_names = set()
+        self.stashed_names = {}
+        self.find_stashed()
+
+        numbered = {}
+        for filepath in self.index.values():
+            if filepath.suffix not in self.suffixes:
+                continue
             try:
-                order_index = self.metadata.order.index(filepath.name)
-                self.metadata.order[order_index] = newpath.name
+                num = int(filepath.stem)
             except ValueError:
-                self.metadata.order.append(newpath.name)
-            try:
-                original_index = tuple(self.metadata.originals.values()).index(
-                    filepath.name
+                continue
+            if num >= 1 and str(num) == filepath.stem:
+                numbered.setdefault(num, []).append(filepath)
+
+        conflicts = {}
+        for num in sorted(numbered):
+            filepaths = numbered[num]
+            if len(filepaths) > 1:
+                filepaths.sort(
+                    key=lambda filepath: self.suffixes.index(filepath.suffix)
                 )
-                original_key = tuple(self.metadata.originals.keys())[original_index]
-                self.metadata.originals[original_key] = newpath.name
-            except ValueError:
-                self.metadata.originals[filepath.name] = newpath.name
+                conflicts[num] = filepaths
+        if not conflicts:
+            return
+        if self.on_conflict == "error":
+            raise FnumConflictException(
+                {
+                    num: tuple(filepath.name for filepath in filepaths)
+                    for num, filepaths in conflicts.items()
+                }
+            )
 
-        filepath.rename(newpath)
-        if self.include_imeta:
-            metapath = Path(ImageMetadata.for_image(str(filepath)))
-            newmetapath = metapath.parents[0] / f"{newpath.stem}{metapath.suffix}"
-            try:
-                metapath.rename(newmetapath)
-            except FileNotFoundError:
-                pass
-        self.num += 1
+        for num, filepaths in conflicts.items():
+            if self.on_conflict == "priority":
+                kept = filepaths[0]
+            elif self.on_conflict == "newest":
+                kept = max(filepaths, key=self.mtime)
+            else:
+                kept = None
+            for filepath in filepaths:
+                if filepath != kept:
+                    self.log.debug(f"Conflict on {num}, moving {filepath.name} to end")
+                    self.defer(filepath)
 
     def find_ordered(self):
         # Find what files we already have in order
         while used_suffixes := tuple(
-            suffix for suffix in self.suffixes if self.numpath(suffix).exists()
+            suffix
+            for suffix in self.suffixes
+            if self.is_candidate(self.numname(suffix))
         ):
-            if len(used_suffixes) > 1:
-                raise FnumException(
-                    f"Unexpectedly found multiple existing files with number {self.num}"
-                )
             if self.regen_meta:
                 filepath = self.numpath(used_suffixes[0])
                 self.metadata.order.append(filepath.name)
@@ -173,8 +357,10 @@ class _NumberOrchestrator:
         # Find files in metadata file's order
         if self.metadata:
             for name in self.metadata.order:
+                if name in self.deferred_names:
+                    continue
                 filepath = self.dirpath / name
-                if filepath.exists():
+                if name in self.index:
                     try:
                         num = int(Path(name).stem)
                         if num >= self.num:
@@ -187,8 +373,10 @@ class _NumberOrchestrator:
                 self.log.debug(f"Missing {name}, removing from metadata")
                 self.removed_files.append(name)
 
-        for filepath in self.dirpath.iterdir():
-            if not filepath.is_file() or filepath.suffix not in self.suffixes:
+        for filepath in self.index.values():
+            if filepath.suffix not in self.suffixes:
+                continue
+            if filepath.name in self.deferred_names:
                 continue
 
             try:
@@ -200,34 +388,130 @@ class _NumberOrchestrator:
                 if filepath not in self.new_files:
                     self.new_files.append(filepath)
 
-    def move_numbered(self):
+    def index_metadata(self):
+        if not self.metadata:
+            return
+
+        # Drop missing files up front, later lookups go through these indexes
+        removed = set(self.removed_files)
+        if removed:
+            self.metadata.order = [
+                name for name in self.metadata.order if name not in removed
+            ]
+            self.metadata.originals = {
+                key: name
+                for key, name in self.metadata.originals.items()
+                if name not in removed
+            }
+
+        self.order_indexes = {}
+        for order_index, name in enumerate(self.metadata.order):
+            self.order_indexes.setdefault(name, order_index)
+        self.original_keys = {}
+        for key, name in self.metadata.originals.items():
+            self.original_keys.setdefault(name, key)
+
+    def plan_moves(self):
+        self.stashes = []
+        for filepath in self.deferred_files:
+            stashpath = self.stashpath(filepath)
+            if filepath.name in self.index:
+                self.stashes.append((filepath, stashpath))
+            self.stashed_names[stashpath.name] = filepath.name
+            if self.metadata:
+                self.rekey_metadata(filepath.name, stashpath.name)
+
+        self.moves = []
         for num in self.ordered_ranges:
-            self.move_file(self.ordered_files[num])
+            self.plan_move(self.ordered_files[num], False)
         for num in self.unordered_ranges:
-            self.move_file(self.unordered_files[num])
-
-    def move_new(self):
+            self.plan_move(self.unordered_files[num], False)
         for filepath in self.new_files:
-            self.move_file(filepath)
+            self.plan_move(filepath, True)
+        for filepath in self.deferred_files:
+            self.plan_move(self.stashpath(filepath), True)
+
+    def plan_move(self, filepath, added):
+        self.moves.append((filepath, self.numpath(filepath.suffix), added))
+        self.num += 1
+
+    def check_moves(self):
+        # Replay the planned renames against the scanned names so every
+        # overwrite is found before anything is renamed
+        occupied = set(self.index)
+        overwrites = []
+
+        def occupy(filepath, newpath):
+            name = self.stashed_names.get(filepath.name, filepath.name)
+            if newpath.name in occupied and newpath != filepath:
+                overwrites.append((name, newpath.name))
+                return
+            occupied.discard(filepath.name)
+            occupied.add(newpath.name)
+
+        for filepath, stashpath in self.stashes:
+            occupy(filepath, stashpath)
+        for filepath, newpath, added in self.moves:
+            occupy(filepath, newpath)
+            if self.include_imeta:
+                metapath = self.metapath(filepath)
+                if metapath.name in occupied:
+                    occupied.discard(metapath.name)
+                    occupied.add(f"{newpath.stem}{metapath.suffix}")
+
+        if overwrites:
+            raise FnumOverwriteException(overwrites)
+
+    def stash_deferred(self):
+        # Conflicting files give up their names before anything else is renamed
+        for filepath, stashpath in self.stashes:
+            self.log.debug(f"Stashing {filepath.name} as {stashpath.name}")
+            self.rename(filepath, stashpath)
+
+    def move_files(self):
+        for filepath, newpath, added in self.moves:
+            self.move_file(filepath, newpath)
+            if added:
+                self.added_files.append(newpath.name)
 
     def maybe_write_metadata(self):
         if not self.metadata:
             return
 
-        for name in self.removed_files:
-            try:
-                self.metadata.order.remove(name)
-            except ValueError:
-                pass
-            try:
-                original_index = tuple(self.metadata.originals.values()).index(name)
-                original_key = tuple(self.metadata.originals.keys())[original_index]
-                del self.metadata.originals[original_key]
-            except ValueError:
-                pass
-
         self.metadata.max = self.num - 1
         if self.write_max:
-            self.metadata.get_max().to_file(self.dirpath)
+            with self.tracer.span("max write"):
+                self.metadata.get_max().to_file(self.dirpath, self.fs)
+            self.index[FnumMax._FILENAME] = self.dirpath / FnumMax._FILENAME
         if self.write_metadata:
-            self.metadata.to_file(self.dirpath)
+            with self.tracer.span("metadata write"):
+                self.metadata.to_file(self.dirpath, self.fs)
+            self.index[FnumMetadata._FILENAME] = self.dirpath / FnumMetadata._FILENAME
+
+    def run(self):
+        self.log.info("Analyzing files...")
+        with self.tracer.span("analyze", dirpath=str(self.dirpath)):
+            if self.index is None:
+                self.scan()
+            self.resolve_conflicts()
+            self.find_ordered()
+            self.find_movable()
+            self.index_metadata()
+            self.plan_moves()
+            self.check_moves()
+
+        self.log.info("Processing files...")
+        with self.tracer.span("process", dirpath=str(self.dirpath)):
+            self.stash_deferred()
+            self.move_files()
+            self.maybe_write_metadata()
+        return self.get_result()
+
+    def get_result(self):
+        return FnumResult(
+            renames=self.renames,
+            added=self.added_files,
+            removed=self.removed_files,
+            max=self.num - 1,
+            metadata=self.metadata,
+        )
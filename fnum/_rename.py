@@ -0,0 +1,62 @@
+import ctypes
+import errno
+import logging
+import os
+import sys
+
+
+_log = logging.getLogger(__name__)
+
+_AT_FDCWD = -100
+_RENAME_NOREPLACE = 1
+# Returned by older kernels and filesystems (often NFS) without the flag
+_UNSUPPORTED = (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP)
+
+
+def _load_renameat2():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+    renameat2 = getattr(libc, "renameat2", None)
+    if renameat2 is None:
+        return None
+    renameat2.argtypes = [
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_uint,
+    ]
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+
+_renameat2 = _load_renameat2()
+
+
+def renameat2_noreplace(src, dst):
+    # Returns False when the rename couldn't be tried, for the caller to check
+    # dst exists itself instead
+    if _renameat2 is None:
+        return False
+    if (
+        _renameat2(
+            _AT_FDCWD,
+            os.fsencode(src),
+            _AT_FDCWD,
+            os.fsencode(dst),
+            _RENAME_NOREPLACE,
+        )
+        == 0
+    ):
+        return True
+    err = ctypes.get_errno()
+    if err not in _UNSUPPORTED:
+        raise OSError(err, os.strerror(err), str(src), None, str(dst))
+    _log.warning(
+        f"{os.path.dirname(os.path.abspath(dst))} doesn't support renaming without overwriting, checking for existing files first instead"
+    )
+    return False
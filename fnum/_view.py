@@ -0,0 +1,283 @@
+import logging
+import os
+from pathlib import Path
+from imeta import ImageMetadata
+
+from ._orchestrator import _NumberOrchestrator, _STASH_PREFIX
+from .exceptions import FnumException
+from .fs import OS_FILESYSTEM
+from .metadata import FnumMetadata, FnumMax
+from .result import FnumResult
+from .trace import NULL_TRACER
+
+
+VIEW_MODES = ("hardlink", "symlink")
+
+
+class _ViewPlan(_NumberOrchestrator):
+    # Numbers the view as if its links were the files themselves, so it ends
+    # up the way number_files would leave them. Nothing is renamed here
+    def __init__(self, viewpath, suffixes, sources, on_conflict, metadata, tracer, fs):
+        super().__init__(
+            viewpath,
+            suffixes,
+            True,
+            False,
+            False,
+            on_conflict,
+            metadata=metadata,
+            tracer=tracer,
+            fs=fs,
+            load_metadata=False,
+        )
+        # Name in the view -> path of the file it stands for
+        self.sources = sources
+        self.moved = None
+
+    def scan(self):
+        self.index = {name: self.dirpath / name for name in self.sources}
+
+    def mtime(self, filepath):
+        with self.tracer.span("stat", file=filepath.name):
+            return self.fs.stat(self.sources[filepath.name]).st_mtime_ns
+
+    def is_numbered(self, name):
+        stem = Path(name).stem
+        return stem.isdecimal() and str(int(stem)) == stem and int(stem) < self.num
+
+    def plan(self):
+        self.scan()
+        self.resolve_conflicts()
+        self.find_ordered()
+        self.find_movable()
+        self.index_metadata()
+        self.plan_moves()
+        self.check_moves()
+
+        self.moved = {}
+        for filepath, newpath, added in self.moves:
+            self.update_metadata(filepath.name, newpath.name)
+            name = self.stashed_names.get(filepath.name, filepath.name)
+            self.moved[name] = newpath.name
+        self.metadata.max = self.num - 1
+
+
+class _ViewOrchestrator:
+    metadata = None
+    source_metadata = None
+
+    source_index = None
+    view_index = None
+    previous = None
+    desired = None
+    removed_files = None
+    added_files = None
+    renames = None
+
+    log = None
+
+    def __init__(
+        self,
+        dirpath,
+        viewpath,
+        suffixes,
+        mode="hardlink",
+        include_imeta=False,
+        on_conflict="error",
+        tracer=None,
+        fs=None,
+    ):
+        if mode not in VIEW_MODES:
+            raise ValueError(f"Unknown view mode {mode}")
+        self.log = logging.getLogger(__name__)
+
+        self.dirpath = Path(dirpath)
+        self.viewpath = Path(viewpath)
+        self.suffixes = suffixes
+        self.mode = mode
+        self.include_imeta = include_imeta
+        self.on_conflict = on_conflict
+        self.tracer = tracer or NULL_TRACER
+        self.fs = fs or OS_FILESYSTEM
+        if os.path.abspath(self.dirpath) == os.path.abspath(self.viewpath):
+            raise FnumException("The view directory must differ from the source")
+
+        self.fs.mkdir(self.viewpath)
+        try:
+            metadata_path = self.viewpath / FnumMetadata._FILENAME
+            self.metadata_str = self.fs.read_bytes(metadata_path).decode()
+            self.metadata = FnumMetadata.from_str(self.metadata_str)
+        except FileNotFoundError:
+            self.metadata_str = None
+            self.metadata = FnumMetadata.get_default()
+            # A new view starts from the order the source was numbered in
+            try:
+                self.source_metadata = FnumMetadata.from_file(self.dirpath, self.fs)
+            except FileNotFoundError:
+                self.source_metadata = None
+
+    def scan_dir(self, dirpath, include_links):
+        # Entries cache their inode, so comparing hardlinks needs no extra stat
+        index = {}
+        with self.tracer.span("scan", dirpath=str(dirpath)):
+            with self.fs.scandir(dirpath) as entries:
+                for entry in entries:
+                    if entry.is_file() or (include_links and entry.is_symlink()):
+                        index[entry.name] = entry
+        return index
+
+    def scan(self):
+        self.source_index = self.scan_dir(self.dirpath, False)
+        self.view_index = self.scan_dir(self.viewpath, True)
+
+    def sidecar_name(self, name):
+        return Path(ImageMetadata.for_image(name)).name
+
+    def plan(self):
+        self.removed_files = []
+        self.previous = {}
+
+        # Links whose source is still there stand in for it, new files join
+        # under their own names unless a link already has that name
+        sources = {}
+        for original, name in self.metadata.originals.items():
+            self.previous[name] = original
+            if self.include_imeta:
+                self.previous[self.sidecar_name(name)] = self.sidecar_name(original)
+            if original in self.source_index:
+                sources[name] = original
+            else:
+                self.log.debug(f"Missing {original}, removing {name} from view")
+                self.removed_files.append(name)
+        linked = set(sources.values())
+        new_names = []
+        for original in sorted(self.source_index):
+            if Path(original).suffix not in self.suffixes or original in linked:
+                continue
+            name = original
+            if name in sources:
+                name = f"{_STASH_PREFIX}new-{original}"
+            sources[name] = original
+            new_names.append(name)
+
+        metadata = self.metadata
+        if self.metadata_str is None:
+            metadata = self.source_metadata
+        plan = _ViewPlan(
+            self.viewpath,
+            self.suffixes,
+            {name: self.dirpath / original for name, original in sources.items()},
+            self.on_conflict,
+            metadata,
+            self.tracer,
+            self.fs,
+        )
+        plan.plan()
+
+        self.desired = {}
+        numbered_names = set()
+        for name, original in sources.items():
+            if name in plan.moved:
+                self.desired[plan.moved[name]] = original
+            elif plan.is_numbered(name):
+                self.desired[name] = original
+            else:
+                continue
+            numbered_names.add(name)
+        self.added_files = [
+            plan.moved.get(name, name) for name in new_names if name in numbered_names
+        ]
+
+        numbered = sorted(self.desired, key=lambda name: int(Path(name).stem))
+        order = []
+        in_order = set()
+        for name in plan.metadata.order + numbered:
+            if name in self.desired and name not in in_order:
+                order.append(name)
+                in_order.add(name)
+        self.metadata.order = order
+        self.metadata.originals = {self.desired[name]: name for name in numbered}
+        self.metadata.max = plan.metadata.max
+
+        if self.include_imeta:
+            for name in numbered:
+                sidecar = self.sidecar_name(self.desired[name])
+                if sidecar in self.source_index:
+                    self.desired[self.sidecar_name(name)] = sidecar
+
+    def is_current(self, name, original):
+        entry = self.view_index.get(name)
+        if entry is None:
+            return False
+        if self.mode == "hardlink":
+            return (
+                not entry.is_symlink()
+                and entry.inode() == self.source_index[original].inode()
+            )
+        return entry.is_symlink() and self.previous.get(name) == original
+
+    def link(self, name, original):
+        sourcepath = self.dirpath / original
+        tmppath = self.viewpath / f".fnum-{name}"
+        with self.tracer.span("link", file=original):
+            # Left behind by a run that stopped before swapping it in
+            if tmppath.name in self.view_index:
+                self.fs.unlink(tmppath)
+            if self.mode == "hardlink":
+                self.fs.link(sourcepath, tmppath)
+            else:
+                self.fs.symlink(os.path.relpath(sourcepath, self.viewpath), tmppath)
+            # Swap the link in so the name never goes missing in the view
+            self.fs.replace(tmppath, self.viewpath / name)
+
+    def update_links(self):
+        self.renames = []
+        for name, original in self.desired.items():
+            if self.is_current(name, original):
+                continue
+            self.log.debug(f"Linking {original} as {name}")
+            self.link(name, original)
+            self.renames.append((original, name))
+
+        for name in self.previous:
+            if name in self.desired or name not in self.view_index:
+                continue
+            self.log.debug(f"Removing {name} from view")
+            with self.tracer.span("unlink", file=name):
+                self.fs.unlink(self.viewpath / name)
+
+    def write_metadata(self):
+        # Unchanged files are left alone so replication doesn't resend them
+        metadata_str = str(self.metadata)
+        if metadata_str != self.metadata_str:
+            with self.tracer.span("metadata write"):
+                self.metadata.to_file(self.viewpath, self.fs)
+        fmax = self.metadata.get_max()
+        try:
+            if FnumMax.from_file(self.viewpath, self.fs).value == fmax.value:
+                return
+        except (FileNotFoundError, ValueError):
+            pass
+        with self.tracer.span("max write"):
+            fmax.to_file(self.viewpath, self.fs)
+
+    def run(self):
+        self.log.info("Analyzing files...")
+        with self.tracer.span("analyze", dirpath=str(self.dirpath)):
+            self.scan()
+            self.plan()
+
+        self.log.info("Processing files...")
+        with self.tracer.span("process", dirpath=str(self.viewpath)):
+            self.update_links()
+            self.write_metadata()
+        return self.get_result()
+
+    def get_result(self):
+        return FnumResult(
+            renames=self.renames,
+            added=self.added_files,
+            removed=self.removed_files,
+            max=self.metadata.max,
+            metadata=self.metadata,
+        )
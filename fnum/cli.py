@@ -1,9 +1,24 @@
 import sys
 import click
+import cProfile
+import csv
+import json
 import logging
 import io
+from contextlib import contextmanager
 
-from . import __version__, number_files, _log
+from . import (
+    __version__,
+    number_files,
+    view_files,
+    _log,
+    CONFLICT_POLICIES,
+    VIEW_MODES,
+)
+from .lock import FileLock
+from .trace import Tracer
+from .verify import verify_metadata, repair_metadata
+from .query import iter_entries, lookup_entries, get_stats
 from .exceptions import FnumException
 
 
@@ -14,19 +29,66 @@ class _ClickFormatter(logging.Formatter):
         return log_str
 
 
-@click.command(
+class _DefaultGroup(click.Group):
+    # Keeps `fnum SUFFIXES DIRPATH` working by falling back to the number command
+    default_command = "number"
+
+    def parse_args(self, ctx, args):
+        if (
+            args
+            and args[0] not in self.commands
+            and args[0]
+            not in (
+                *ctx.help_option_names,
+                "--version",
+            )
+        ):
+            args.insert(0, self.default_command)
+        return super().parse_args(ctx, args)
+
+
+_CONTEXT_SETTINGS = {
+    "help_option_names": ["-h", "--help"],
+}
+
+
+@click.group(
+    cls=_DefaultGroup,
+    help="""
+Renames files in a directory using sequential integers.\n
+Runs the number command unless another command is given.
+""",
+    context_settings=_CONTEXT_SETTINGS,
+)
+@click.version_option(version=__version__)
+def cli():
+    pass
+
+
+def _split_suffixes(suffixes):
+    if "/" in suffixes:
+        click.echo("Suffixes contains a '/', did you mean ','?", err=True)
+    return suffixes.split(",")
+
+
+def _setup_log(verbose):
+    _log.setLevel(logging.DEBUG if verbose > 0 else logging.INFO)
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(_ClickFormatter())
+    _log.addHandler(handler)
+    return handler
+
+
+@cli.command(
     help="""
 Renames files in a directory using sequential integers.\n
 Suffixes is a comma separated list of file extensions to rename (eg. .jpg,.gif).\n
 Dirpath is a directory to rename files in.
 """,
-    context_settings={
-        "help_option_names": ["-h", "--help"],
-    },
+    context_settings=_CONTEXT_SETTINGS,
 )
 @click.argument("suffixes", nargs=1)
 @click.argument("dirpath", nargs=1)
-@click.version_option(version=__version__)
 @click.option(
     "--write-max/--no-write-max",
     default=False,
@@ -52,33 +114,282 @@ Originals maps the original filenames to what they were renamed to.
 Also rename image metadata files generated by imeta.
     """,
 )
+@click.option(
+    "--on-conflict",
+    type=click.Choice(CONFLICT_POLICIES),
+    default="error",
+    help="""
+What to do when several files share a number with different suffixes (eg. 1.jpg and 1.png).\n
+Error stops without renaming anything and lists every conflict.\n
+Priority keeps the number for the suffix listed first, newest keeps it for the most recently modified file and append keeps it for neither. The other files are renamed after any new files.
+    """,
+)
+@click.option(
+    "--view",
+    type=click.Path(file_okay=False),
+    help="""
+Leave files in dirpath untouched and create numbered links to them in this directory instead.\n
+Only links that changed since the last run are created or removed. fnum.metadata.yaml and fnum.max.txt are always written to the view directory.\n
+Can't be used with --write-max, --write-metadata or --lock.
+    """,
+)
+@click.option(
+    "--view-mode",
+    type=click.Choice(VIEW_MODES),
+    default="hardlink",
+    help="""
+Whether the view is made of hardlinks or relative symlinks.
+    """,
+)
+@click.option(
+    "--lock/--no-lock",
+    default=False,
+    help="""
+Take a lock on fnum.lock in dirpath while numbering, waiting for any other fnum run on the same directory to finish first.\n
+The lock is released when the run holding it finishes or its process exits, a hung run has to be stopped before others can continue.
+    """,
+)
+@click.option(
+    "--lock-timeout",
+    type=float,
+    help="""
+Give up after waiting this many seconds for the lock.
+    """,
+)
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False, writable=True),
+    help="""
+Write cProfile stats for the run to this file, readable with pstats or snakeviz.
+    """,
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False, writable=True),
+    help="""
+Write a Chrome trace-event JSON file with spans for each scan, stat, rename and metadata update, readable with chrome://tracing or Perfetto.
+    """,
+)
 @click.option(
     "-v",
     "--verbose",
     count=True,
 )
-def cli(**kwargs):
+def number(**kwargs):
+    if kwargs["view"]:
+        unsupported = [
+            option
+            for option, used in (
+                ("--write-max", kwargs["write_max"]),
+                ("--write-metadata", kwargs["write_metadata"]),
+                ("--lock", kwargs["lock"]),
+                ("--lock-timeout", kwargs["lock_timeout"] is not None),
+            )
+            if used
+        ]
+        if unsupported:
+            raise click.UsageError(
+                f"--view can't be used with {', '.join(unsupported)}"
+            )
+
     dirpath = kwargs["dirpath"]
-    if "/" in kwargs["suffixes"]:
-        click.echo("Suffixes contains a '/', did you mean ','?", err=True)
-    suffixes = kwargs["suffixes"].split(",")
+    suffixes = _split_suffixes(kwargs["suffixes"])
+    handler = _setup_log(kwargs["verbose"])
 
-    _log.setLevel(logging.DEBUG if kwargs["verbose"] > 0 else logging.INFO)
-    handler = logging.StreamHandler(io.StringIO())
-    handler.setFormatter(_ClickFormatter())
-    _log.addHandler(handler)
+    tracer = Tracer() if kwargs["trace"] else None
+    lock = None
+    if kwargs["lock"]:
+        lock = FileLock(timeout=kwargs["lock_timeout"])
+    profile = cProfile.Profile() if kwargs["profile"] else None
 
     try:
         try:
-            number_files(
-                dirpath=dirpath,
-                suffixes=suffixes,
-                write_metadata=kwargs["write_metadata"],
-                write_max=kwargs["write_max"],
-                include_imeta=kwargs["include_imeta"],
-            )
+            if profile:
+                profile.enable()
+            if kwargs["view"]:
+                view_files(
+                    dirpath=dirpath,
+                    viewpath=kwargs["view"],
+                    suffixes=suffixes,
+                    mode=kwargs["view_mode"],
+                    include_imeta=kwargs["include_imeta"],
+                    on_conflict=kwargs["on_conflict"],
+                    tracer=tracer,
+                )
+            else:
+                number_files(
+                    dirpath=dirpath,
+                    suffixes=suffixes,
+                    write_metadata=kwargs["write_metadata"],
+                    write_max=kwargs["write_max"],
+                    include_imeta=kwargs["include_imeta"],
+                    on_conflict=kwargs["on_conflict"],
+                    tracer=tracer,
+                    lock=lock,
+                )
+        finally:
+            if profile:
+                profile.disable()
+                profile.dump_stats(kwargs["profile"])
+            if tracer:
+                tracer.to_file(kwargs["trace"])
+            _log.removeHandler(handler)
+    except (FnumException, FileNotFoundError) as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+
+
+@cli.command(
+    help="""
+Checks fnum.metadata.yaml against the files in a directory and lists every inconsistency.\n
+Suffixes is a comma separated list of file extensions fnum renames (eg. .jpg,.gif).\n
+Dirpath is a directory containing fnum.metadata.yaml.
+""",
+    context_settings=_CONTEXT_SETTINGS,
+)
+@click.argument("suffixes", nargs=1)
+@click.argument("dirpath", nargs=1)
+@click.option(
+    "--repair/--no-repair",
+    default=False,
+    help="""
+Rewrite fnum.metadata.yaml (and fnum.max.txt if present) to match the directory, migrating it to the current version.\n
+Conflicting or missing numbers can't be repaired this way, running fnum again renumbers the files.
+    """,
+)
+@click.option(
+    "-v",
+    "--verbose",
+    count=True,
+)
+def verify(**kwargs):
+    suffixes = _split_suffixes(kwargs["suffixes"])
+    handler = _setup_log(kwargs["verbose"])
+
+    try:
+        try:
+            check = repair_metadata if kwargs["repair"] else verify_metadata
+            issues = check(kwargs["dirpath"], suffixes)
         finally:
             _log.removeHandler(handler)
     except (FnumException, FileNotFoundError) as e:
         click.echo(str(e), err=True)
         sys.exit(1)
+
+    for issue in issues:
+        click.echo(repr(issue))
+    if any(not (kwargs["repair"] and issue.repairable) for issue in issues):
+        sys.exit(1)
+
+
+class _RangeType(click.ParamType):
+    name = "range"
+
+    def convert(self, value, param, ctx):
+        # Accepts N, N-M, N- or -M
+        start, sep, end = value.partition("-")
+        try:
+            start = int(start) if start else None
+            end = int(end) if end else (None if sep else start)
+        except ValueError:
+            self.fail(f"{value} isn't a number or range like 10-20", param, ctx)
+        return start, end
+
+
+_RANGE_OPTION = click.option(
+    "--range",
+    "numrange",
+    type=_RangeType(),
+    default="-",
+    help="""
+Only include files numbered in this range, eg. 10-20, 10- or -20.
+    """,
+)
+
+
+@contextmanager
+def _exit_on_error():
+    try:
+        yield
+    except (FnumException, FileNotFoundError) as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+
+
+class _EchoWriter:
+    def write(self, data):
+        click.echo(data, nl=False)
+
+
+@cli.command(
+    help="""
+Looks up files in fnum.metadata.yaml.\n
+Dirpath is a directory containing fnum.metadata.yaml.\n
+Keys are numbers, numbered filenames or original filenames. Each match is printed as its number, filename and original filename separated by tabs.
+""",
+    context_settings=_CONTEXT_SETTINGS,
+)
+@click.argument("dirpath", nargs=1)
+@click.argument("keys", nargs=-1, required=True)
+def lookup(dirpath, keys):
+    found = False
+    with _exit_on_error():
+        for number, name, original in lookup_entries(dirpath, keys):
+            click.echo(f"{number}\t{name}\t{original}")
+            found = True
+    if not found:
+        sys.exit(1)
+
+
+@cli.command(
+    help="""
+Exports the files in fnum.metadata.yaml one per line, in the order they are stored.\n
+Dirpath is a directory containing fnum.metadata.yaml.
+""",
+    context_settings=_CONTEXT_SETTINGS,
+)
+@click.argument("dirpath", nargs=1)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["jsonl", "csv"]),
+    default="jsonl",
+    help="""
+Write one JSON object per line, or CSV with a header row.
+    """,
+)
+@_RANGE_OPTION
+def export(dirpath, output_format, numrange):
+    with _exit_on_error():
+        entries = iter_entries(dirpath, *numrange)
+        if output_format == "csv":
+            writer = csv.writer(_EchoWriter(), lineterminator="\n")
+            writer.writerow(["number", "name", "original"])
+            writer.writerows(entries)
+            return
+        for number, name, original in entries:
+            click.echo(
+                json.dumps(
+                    {"number": number, "name": name, "original": original},
+                    ensure_ascii=False,
+                )
+            )
+
+
+@cli.command(
+    help="""
+Summarizes fnum.metadata.yaml without loading it all at once.\n
+Dirpath is a directory containing fnum.metadata.yaml.
+""",
+    context_settings=_CONTEXT_SETTINGS,
+)
+@click.argument("dirpath", nargs=1)
+@_RANGE_OPTION
+def stats(dirpath, numrange):
+    with _exit_on_error():
+        results = get_stats(dirpath, *numrange)
+    suffixes = results.pop("suffixes")
+    for key, value in results.items():
+        click.echo(f"{key}: {'' if value is None else value}".rstrip())
+    for suffix, count in sorted(suffixes.items()):
+        click.echo(f"suffix {suffix}: {count}")
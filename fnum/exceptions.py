@@ -1,2 +1,26 @@
 class FnumException(Exception):
     pass
+
+
+class FnumConflictException(FnumException):
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        details = ", ".join(
+            f"{num} ({', '.join(names)})" for num, names in conflicts.items()
+        )
+        super().__init__(
+            f"Unexpectedly found multiple existing files with numbers {details}"
+        )
+
+
+class FnumOverwriteException(FnumException):
+    def __init__(self, overwrites):
+        self.overwrites = overwrites
+        details = ", ".join(
+            f"{newname} (renaming {name})" for name, newname in overwrites
+        )
+        super().__init__(f"Can't override existing files {details}")
+
+
+class FnumLockException(FnumException):
+    pass
@@ -0,0 +1,71 @@
+import errno
+import os
+from pathlib import Path
+
+from ._rename import renameat2_noreplace
+
+
+class OsFilesystem:
+    # Every filesystem call fnum makes while numbering goes through here, so
+    # a subclass can count, slow down or fail them
+    def __init__(self):
+        # Directories where the kernel can't refuse to overwrite on rename
+        self._noreplace_unsupported = set()
+
+    def scandir(self, dirpath):
+        return os.scandir(dirpath)
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def lexists(self, path):
+        return os.path.lexists(path)
+
+    def rename(self, src, dst):
+        os.rename(src, dst)
+
+    def renameat2_noreplace(self, src, dst):
+        return renameat2_noreplace(src, dst)
+
+    def rename_noreplace(self, src, dst):
+        # Let the kernel refuse to overwrite dst, only trying once in
+        # directories where it can't
+        dirpath = os.path.dirname(os.path.abspath(dst))
+        if dirpath not in self._noreplace_unsupported:
+            if self.renameat2_noreplace(src, dst):
+                return
+            self._noreplace_unsupported.add(dirpath)
+
+        # Only a file created between this check and the rename can be overwritten
+        if self.lexists(dst):
+            raise FileExistsError(
+                errno.EEXIST, os.strerror(errno.EEXIST), str(src), None, str(dst)
+            )
+        self.rename(src, dst)
+
+    def replace(self, src, dst):
+        os.replace(src, dst)
+
+    def link(self, src, dst):
+        os.link(src, dst)
+
+    def symlink(self, src, dst):
+        os.symlink(src, dst)
+
+    def unlink(self, path):
+        os.unlink(path)
+
+    def mkdir(self, path):
+        Path(path).mkdir(parents=True, exist_ok=True)
+
+    def open(self, path):
+        return open(path, "rb")
+
+    def read_bytes(self, path):
+        return Path(path).read_bytes()
+
+    def write_bytes(self, path, data):
+        Path(path).write_bytes(data)
+
+
+OS_FILESYSTEM = OsFilesystem()
@@ -0,0 +1,143 @@
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from .exceptions import FnumLockException
+
+
+class FileLock:
+    # Directory lock built on fcntl record locks, which NFS forwards to the
+    # server so it holds across hosts. The lock is only released when the
+    # holder finishes or its process exits, a hung holder blocks everyone.
+    # The holder is recorded in the lock file for waiters to report.
+    _FILENAME = "fnum.lock"
+
+    _thread_locks = {}
+    _thread_locks_lock = threading.Lock()
+
+    def __init__(self, timeout=None, poll=0.5):
+        self.timeout = timeout
+        self.poll = poll
+
+    @classmethod
+    def _thread_lock(cls, key):
+        # fcntl locks belong to the process, so threads also need to queue here
+        with cls._thread_locks_lock:
+            return cls._thread_locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _read_holder(lockpath):
+        try:
+            return json.loads(lockpath.read_bytes() or b"null")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _timeout_error(self, dirpath, lockpath):
+        message = f"Timed out waiting for the lock on {dirpath}"
+        holder = self._read_holder(lockpath)
+        if holder:
+            message += f", held by {holder['host']} pid {holder['pid']}"
+        return FnumLockException(message)
+
+    @contextmanager
+    def acquire(self, dirpath):
+        lockpath = Path(dirpath) / self._FILENAME
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        thread_lock = self._thread_lock(os.path.abspath(lockpath))
+        if not thread_lock.acquire(timeout=-1 if deadline is None else self.timeout):
+            raise self._timeout_error(dirpath, lockpath)
+        try:
+            fd = os.open(lockpath, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if deadline is None:
+                    fcntl.lockf(fd, fcntl.LOCK_EX)
+                else:
+                    delay = 0.01
+                    while True:
+                        try:
+                            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            break
+                        except OSError:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                raise self._timeout_error(dirpath, lockpath)
+                            time.sleep(min(delay, remaining))
+                            delay = min(delay * 2, self.poll)
+
+                holder = {
+                    "host": socket.gethostname(),
+                    "pid": os.getpid(),
+                }
+                os.ftruncate(fd, 0)
+                os.pwrite(fd, json.dumps(holder).encode(), 0)
+                try:
+                    yield
+                finally:
+                    os.ftruncate(fd, 0)
+                    fcntl.lockf(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        finally:
+            thread_lock.release()
+
+
+class _Run:
+    def __init__(self):
+        self.started = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_queued_runs = {}
+_queued_runs_lock = threading.Lock()
+
+
+def _run_locked(dirpath, func, lock=None, merge_key=None):
+    context = lock.acquire(dirpath) if lock else nullcontext()
+    if merge_key is None:
+        with context:
+            return func()
+
+    # Callers with the same arguments and lock share one queued run, so a
+    # directory is only scanned again for callers that arrived after a run
+    # started
+    timeout = getattr(lock, "timeout", None)
+    merge_key = (merge_key, lock, timeout)
+    with _queued_runs_lock:
+        run = _queued_runs.get(merge_key)
+        leader = run is None
+        if leader:
+            run = _queued_runs[merge_key] = _Run()
+    if not leader:
+        # Each caller only waits its own timeout for the shared run to get
+        # the lock
+        if not run.started.wait(timeout):
+            raise FnumLockException(f"Timed out waiting for the lock on {dirpath}")
+        run.done.wait()
+        if run.error:
+            raise run.error
+        return run.result
+
+    try:
+        with context:
+            with _queued_runs_lock:
+                del _queued_runs[merge_key]
+            run.started.set()
+            run.result = func()
+        return run.result
+    except BaseException as e:
+        run.error = e
+        raise
+    finally:
+        with _queued_runs_lock:
+            if _queued_runs.get(merge_key) is run:
+                del _queued_runs[merge_key]
+        run.started.set()
+        run.done.set()
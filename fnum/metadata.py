@@ -2,26 +2,124 @@ from pathlib import Path
 from collections import OrderedDict
 import yaml
 
+from .exceptions import FnumException
+from .fs import OS_FILESYSTEM
+
+
+# libyaml is much faster when pyyaml was built with it
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _skip_node(events, event):
+    depth = 0
+    while True:
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return
+        event = next(events)
+
+
+def _scalar_value(event):
+    if isinstance(event, yaml.ScalarEvent) and not (
+        event.implicit[0] and event.value in ("", "~", "null", "Null", "NULL")
+    ):
+        return event.value
+    return None
+
 
 class FnumMetadata:
     _FIELDS = ["order", "originals", "max"]
     _FILENAME = "fnum.metadata.yaml"
+    # Files without a version key are version 1, the key is only written
+    # once a newer version exists
+    VERSION = 1
+    # Functions upgrading metadata from each older version to the next one
+    _MIGRATIONS = {}
 
     def __init__(self, data):
         self._raw_data = data
         for field in self._FIELDS:
             setattr(self, field, data.get(field))
+        self.version = data.get("version", 1)
+
+    def migrate(self):
+        if not isinstance(self.version, int) or self.version > self.VERSION:
+            raise FnumException(
+                f"Unsupported metadata version {self.version}, expected at most {self.VERSION}"
+            )
+        while self.version < self.VERSION:
+            self._MIGRATIONS[self.version](self)
+            self.version += 1
+        return self
 
     @classmethod
     def from_str(cls, data_str):
-        data = yaml.safe_load(data_str)
-        return cls(data)
+        data = yaml.load(data_str, Loader=_Loader)
+        return cls(data).migrate()
 
     @classmethod
-    def from_file(cls, dirpath):
-        data_str = (Path(dirpath) / cls._FILENAME).read_bytes()
+    def from_file(cls, dirpath, fs=OS_FILESYSTEM):
+        data_str = fs.read_bytes(Path(dirpath) / cls._FILENAME)
         return cls.from_str(data_str)
 
+    @classmethod
+    def _check_version(cls, value):
+        try:
+            version = int(value)
+        except (TypeError, ValueError):
+            version = value
+        if isinstance(version, int) and version < cls.VERSION:
+            raise FnumException(
+                f"Metadata version {version} needs migrating to {cls.VERSION}, run fnum verify --repair first"
+            )
+        if version != cls.VERSION:
+            raise FnumException(
+                f"Unsupported metadata version {version}, expected at most {cls.VERSION}"
+            )
+
+    @classmethod
+    def iter_file(cls, dirpath, fs=OS_FILESYSTEM):
+        # Yields ("max", max), ("order", name) and ("originals", (original, name))
+        # while parsing, so large files are never loaded whole. Version is
+        # written first, so it's checked before anything is yielded
+        with fs.open(Path(dirpath) / cls._FILENAME) as stream:
+            events = yaml.parse(stream, Loader=_Loader)
+            for event in events:
+                if isinstance(event, yaml.MappingStartEvent):
+                    break
+            else:
+                return
+            first = True
+            for event in events:
+                if isinstance(event, yaml.MappingEndEvent):
+                    return
+                key = event.value
+                event = next(events)
+                if key == "version":
+                    cls._check_version(_scalar_value(event))
+                elif first and cls.VERSION != 1:
+                    # Files without a version key are version 1
+                    cls._check_version(1)
+                first = False
+                if key == "max":
+                    value = _scalar_value(event)
+                    yield "max", None if value is None else int(value)
+                elif key == "order" and isinstance(event, yaml.SequenceStartEvent):
+                    for event in events:
+                        if isinstance(event, yaml.SequenceEndEvent):
+                            break
+                        yield "order", event.value
+                elif key == "originals" and isinstance(event, yaml.MappingStartEvent):
+                    for event in events:
+                        if isinstance(event, yaml.MappingEndEvent):
+                            break
+                        yield "originals", (event.value, next(events).value)
+                elif key != "version":
+                    _skip_node(events, event)
+
     @classmethod
     def get_default(cls):
         return FnumMetadata(
@@ -46,18 +144,25 @@ class FnumMetadata:
         data = OrderedDict()
         for field in self._FIELDS:
             data[field] = getattr(self, field)
+        if self.version != 1 or "version" in self._raw_data:
+            data["version"] = self.version
         for key in self._raw_data.keys():
             if key not in data:
                 data[key] = self._raw_data[key]
         return data.items().__iter__()
 
     def __repr__(self):
-        data_str = yaml.safe_dump(dict(self), allow_unicode=True)
+        data = dict(self)
+        # Version goes before the sorted keys so streaming readers see it first
+        data_str = ""
+        if "version" in data:
+            data_str = yaml.safe_dump({"version": data.pop("version")})
+        data_str += yaml.safe_dump(data, allow_unicode=True)
         return data_str
 
-    def to_file(self, dirpath):
+    def to_file(self, dirpath, fs=OS_FILESYSTEM):
         data_str = str(self).encode()
-        (Path(dirpath) / self._FILENAME).write_bytes(data_str)
+        fs.write_bytes(Path(dirpath) / self._FILENAME, data_str)
 
 
 class FnumMax:
@@ -71,13 +176,13 @@ class FnumMax:
         return cls(int(value_str))
 
     @classmethod
-    def from_file(cls, dirpath):
-        value_str = (Path(dirpath) / cls._FILENAME).read_text()
+    def from_file(cls, dirpath, fs=OS_FILESYSTEM):
+        value_str = fs.read_bytes(Path(dirpath) / cls._FILENAME).decode()
         return cls.from_str(value_str)
 
     def __repr__(self):
         return str(self.value)
 
-    def to_file(self, dirpath):
+    def to_file(self, dirpath, fs=OS_FILESYSTEM):
         value_str = str(self)
-        (Path(dirpath) / self._FILENAME).write_text(value_str)
+        fs.write_bytes(Path(dirpath) / self._FILENAME, value_str.encode())
@@ -0,0 +1,75 @@
+from collections import Counter
+from pathlib import Path
+
+from .fs import OS_FILESYSTEM
+from .metadata import FnumMetadata
+
+
+def _number(name):
+    try:
+        return int(Path(name).stem)
+    except ValueError:
+        return None
+
+
+def _in_range(number, start, end):
+    if start is None and end is None:
+        return True
+    return (
+        number is not None
+        and (start is None or number >= start)
+        and (end is None or number <= end)
+    )
+
+
+def iter_entries(dirpath, start=None, end=None, fs=OS_FILESYSTEM):
+    # Yields (number, name, original) in file order, limited to numbers in
+    # [start, end] when either is given
+    for field, value in FnumMetadata.iter_file(dirpath, fs):
+        if field == "originals":
+            original, name = value
+            number = _number(name)
+            if _in_range(number, start, end):
+                yield number, name, original
+
+
+def lookup_entries(dirpath, keys, fs=OS_FILESYSTEM):
+    # Keys can be a number, a numbered name or an original name
+    numbers = {int(key) for key in keys if key.isdecimal()}
+    names = set(keys)
+    for number, name, original in iter_entries(dirpath, fs=fs):
+        if number in numbers or name in names or original in names:
+            yield number, name, original
+
+
+def get_stats(dirpath, start=None, end=None, fs=OS_FILESYSTEM):
+    stats = {
+        "max": None,
+        "order": 0,
+        "entries": 0,
+        "first": None,
+        "last": None,
+        "renamed": 0,
+        "suffixes": Counter(),
+    }
+    for field, value in FnumMetadata.iter_file(dirpath, fs):
+        if field == "max":
+            stats["max"] = value
+        elif field == "order":
+            if _in_range(_number(value), start, end):
+                stats["order"] += 1
+        else:
+            original, name = value
+            number = _number(name)
+            if not _in_range(number, start, end):
+                continue
+            stats["entries"] += 1
+            if number is not None:
+                if stats["first"] is None or number < stats["first"]:
+                    stats["first"] = number
+                if stats["last"] is None or number > stats["last"]:
+                    stats["last"] = number
+            if name != original:
+                stats["renamed"] += 1
+            stats["suffixes"][Path(name).suffix] += 1
+    return stats
@@ -0,0 +1,21 @@
+class FnumResult:
+    def __init__(self, renames, added, removed, max, metadata):
+        # (old name, new name) pairs in the order they were renamed
+        self.renames = renames
+        # New names of files that weren't numbered before this run
+        self.added = added
+        # Names that were missing from disk and dropped from the metadata
+        self.removed = removed
+        self.max = max
+        # Updated metadata, or None if it isn't being tracked
+        self.metadata = metadata
+
+    @property
+    def changed(self):
+        return bool(self.renames or self.removed)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(renames={len(self.renames)}, "
+            f"added={len(self.added)}, removed={len(self.removed)}, max={self.max})"
+        )
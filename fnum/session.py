@@ -0,0 +1,126 @@
+import copy
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+from ._orchestrator import _NumberOrchestrator
+from .exceptions import FnumException
+from .fs import OS_FILESYSTEM
+from .metadata import FnumMetadata
+
+
+class _SessionEntry:
+    def __init__(self, stamp, metadata, index):
+        self.stamp = stamp
+        self.metadata = metadata
+        self.index = index
+
+
+class NumberSession:
+    def __init__(self, maxsize=256, fs=None):
+        self.maxsize = maxsize
+        self.fs = fs or OS_FILESYSTEM
+        self.closed = False
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _key(dirpath):
+        return os.path.abspath(dirpath)
+
+    def _stamp(self, dirpath):
+        # Renames change the directory mtime, but rewriting the metadata file
+        # in place doesn't, so both are needed to notice outside changes
+        try:
+            metadata_path = dirpath / FnumMetadata._FILENAME
+            metadata_mtime = self.fs.stat(metadata_path).st_mtime_ns
+        except FileNotFoundError:
+            metadata_mtime = None
+        return (self.fs.stat(dirpath).st_mtime_ns, metadata_mtime)
+
+    def _lookup(self, key, dirpath):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.stamp != self._stamp(dirpath):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def number_files(
+        self,
+        dirpath,
+        suffixes,
+        write_metadata=False,
+        write_max=False,
+        include_imeta=False,
+        on_conflict="error",
+        tracer=None,
+    ):
+        if self.closed:
+            raise FnumException("Can't number files with a closed session")
+
+        dirpath = Path(dirpath)
+        key = self._key(dirpath)
+        entry = self._lookup(key, dirpath)
+        if entry is None:
+            try:
+                metadata = FnumMetadata.from_file(dirpath, self.fs)
+            except FileNotFoundError:
+                metadata = None
+            index = None
+        else:
+            metadata = entry.metadata
+            index = entry.index
+            del self._entries[key]
+
+        # The orchestrator updates both in place, only keep what ends up on disk
+        orchestrator = _NumberOrchestrator(
+            dirpath,
+            suffixes,
+            write_metadata,
+            write_max,
+            include_imeta,
+            on_conflict,
+            metadata=copy.deepcopy(metadata),
+            index=index,
+            tracer=tracer,
+            fs=self.fs,
+            load_metadata=False,
+        )
+        result = orchestrator.run()
+
+        if write_metadata:
+            metadata = orchestrator.metadata
+        self._store(
+            key, _SessionEntry(self._stamp(dirpath), metadata, orchestrator.index)
+        )
+        return result
+
+    def refresh(self, dirpath=None):
+        if dirpath is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(self._key(dirpath), None)
+
+    def close(self):
+        self._entries.clear()
+        self.closed = True
+
+    def __contains__(self, dirpath):
+        return self._key(dirpath) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
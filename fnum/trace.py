@@ -0,0 +1,52 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+
+class Tracer:
+    # Collects spans as Chrome trace events (chrome://tracing, Perfetto, speedscope)
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": "fnum",
+                    "ph": "X",
+                    "ts": start / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": self.pid,
+                    "tid": threading.get_ident(),
+                    "args": args,
+                }
+            )
+
+    def to_dict(self):
+        return {"traceEvents": self.events, "displayTimeUnit": "ms"}
+
+    def __repr__(self):
+        return json.dumps(self.to_dict())
+
+    def to_file(self, filepath):
+        Path(filepath).write_text(str(self))
+
+
+class _NullTracer:
+    _CONTEXT = nullcontext()
+
+    def span(self, name, **args):
+        return self._CONTEXT
+
+
+NULL_TRACER = _NullTracer()
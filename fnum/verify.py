@@ -0,0 +1,189 @@
+import logging
+import os
+from pathlib import Path
+import yaml
+
+from .metadata import FnumMetadata, FnumMax
+
+
+_log = logging.getLogger(__name__)
+
+
+class FnumIssue:
+    def __init__(self, kind, name, message, repairable=True):
+        self.kind = kind
+        self.name = name
+        self.message = message
+        # Issues that need files renamed are left for number_files to fix
+        self.repairable = repairable
+
+    def __repr__(self):
+        return f"{self.kind}: {self.message}"
+
+
+class _Verifier:
+    def __init__(self, dirpath, suffixes):
+        self.dirpath = Path(dirpath)
+        self.suffixes = suffixes
+        self.issues = []
+
+    def report(self, kind, name, message, repairable=True):
+        self.issues.append(FnumIssue(kind, name, message, repairable))
+
+    def load(self):
+        data_str = (self.dirpath / FnumMetadata._FILENAME).read_bytes()
+        data = yaml.safe_load(data_str)
+        if not isinstance(data, dict):
+            self.report("invalid", None, "Metadata isn't a mapping, resetting it")
+            data = {}
+        self.metadata = FnumMetadata(data)
+        version = self.metadata.version
+        self.metadata.migrate()
+        if self.metadata.version != version:
+            self.report(
+                "version",
+                None,
+                f"Metadata is version {version}, migrating to {self.metadata.version}",
+            )
+
+        defaults = FnumMetadata.get_default()
+        for field, kind in (("order", list), ("originals", dict)):
+            if not isinstance(getattr(self.metadata, field), kind):
+                self.report(
+                    "invalid", field, f"Metadata {field} isn't a {kind.__name__}"
+                )
+                setattr(self.metadata, field, getattr(defaults, field))
+        if self.metadata.max is not None and not isinstance(self.metadata.max, int):
+            self.report("invalid", "max", "Metadata max isn't a number")
+            self.metadata.max = None
+
+    def scan(self):
+        self.files = set()
+        self.numbered = {}
+        with os.scandir(self.dirpath) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                self.files.add(entry.name)
+                stem, suffix = os.path.splitext(entry.name)
+                if (
+                    suffix in self.suffixes
+                    and stem.isdecimal()
+                    and str(int(stem)) == stem
+                    and int(stem) >= 1
+                ):
+                    self.numbered.setdefault(int(stem), []).append(entry.name)
+
+        self.max = 0
+        while self.max + 1 in self.numbered:
+            self.max += 1
+        for num in sorted(self.numbered):
+            names = self.numbered[num]
+            if len(names) > 1:
+                self.report(
+                    "conflict",
+                    str(num),
+                    f"Multiple files numbered {num}: {', '.join(sorted(names))}",
+                    repairable=False,
+                )
+            if num > self.max:
+                self.report(
+                    "gap",
+                    names[0],
+                    f"{names[0]} comes after a gap at {self.max + 1}",
+                    repairable=False,
+                )
+
+    def check_order(self):
+        order = []
+        seen = set()
+        for name in self.metadata.order:
+            if name in seen:
+                self.report(
+                    "duplicate-order", name, f"{name} is in order more than once"
+                )
+                continue
+            seen.add(name)
+            if name not in self.files:
+                self.report("missing-order", name, f"{name} is in order but missing")
+                continue
+            order.append(name)
+        for num in sorted(self.numbered):
+            for name in sorted(self.numbered[num]):
+                if name not in seen:
+                    self.report("unordered", name, f"{name} is missing from order")
+                    order.append(name)
+        self.metadata.order = order
+
+    def check_originals(self):
+        originals = {}
+        mapped = set()
+        for original, name in self.metadata.originals.items():
+            if name not in self.files:
+                self.report(
+                    "orphaned-original",
+                    original,
+                    f"{original} maps to missing file {name}",
+                )
+                continue
+            if name in mapped:
+                self.report(
+                    "duplicate-original",
+                    original,
+                    f"{original} maps to {name} which another original already maps to",
+                )
+                continue
+            mapped.add(name)
+            originals[original] = name
+        for num in sorted(self.numbered):
+            for name in sorted(self.numbered[num]):
+                if name not in mapped:
+                    self.report("unmapped", name, f"{name} has no original")
+                    originals.setdefault(name, name)
+        self.metadata.originals = originals
+
+    def check_max(self):
+        if self.metadata.max != self.max:
+            self.report(
+                "max",
+                "max",
+                f"Metadata max is {self.metadata.max}, expected {self.max}",
+            )
+            self.metadata.max = self.max
+        if FnumMax._FILENAME in self.files:
+            try:
+                value = FnumMax.from_file(self.dirpath).value
+            except ValueError:
+                value = None
+            if value != self.max:
+                self.report(
+                    "max-file",
+                    FnumMax._FILENAME,
+                    f"{FnumMax._FILENAME} contains {value}, expected {self.max}",
+                )
+
+    def run(self):
+        self.load()
+        self.scan()
+        self.check_order()
+        self.check_originals()
+        self.check_max()
+        return self.issues
+
+    def write(self):
+        self.metadata.to_file(self.dirpath)
+        if FnumMax._FILENAME in self.files:
+            self.metadata.get_max().to_file(self.dirpath)
+
+
+def verify_metadata(dirpath, suffixes):
+    return _Verifier(dirpath, suffixes).run()
+
+
+def repair_metadata(dirpath, suffixes):
+    verifier = _Verifier(dirpath, suffixes)
+    issues = verifier.run()
+    if any(issue.repairable for issue in issues):
+        _log.info(f"Repairing {FnumMetadata._FILENAME}...")
+        verifier.write()
+    return issues
@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from fnum.exceptions import FnumLockException
+
+
+class LocalLockServer:
+    # In-process stand-in for a lock server, granting each directory to one
+    # holder at a time in the order callers queued. A holder whose lease runs
+    # out loses the lock to the next caller in the queue.
+    def __init__(self, timeout=None, lease=300):
+        self.timeout = timeout
+        self.lease = lease
+        self._condition = threading.Condition()
+        self._holders = {}
+        self._queues = {}
+
+    def _expired(self, key):
+        holder = self._holders.get(key)
+        return holder is not None and holder[1] < time.monotonic()
+
+    def holder(self, dirpath):
+        with self._condition:
+            holder = self._holders.get(os.path.abspath(dirpath))
+            return holder[0] if holder else None
+
+    def queued(self, dirpath):
+        with self._condition:
+            return len(self._queues.get(os.path.abspath(dirpath), ()))
+
+    @contextmanager
+    def acquire(self, dirpath):
+        key = os.path.abspath(dirpath)
+        ticket = object()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        with self._condition:
+            queue = self._queues.setdefault(key, [])
+            queue.append(ticket)
+            while queue[0] is not ticket or (
+                key in self._holders and not self._expired(key)
+            ):
+                wait = None
+                if deadline is not None:
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        queue.remove(ticket)
+                        self._condition.notify_all()
+                        raise FnumLockException(
+                            f"Timed out waiting for the lock on {dirpath}"
+                        )
+                if queue[0] is ticket and key in self._holders:
+                    expires = self._holders[key][1] - time.monotonic()
+                    wait = expires if wait is None else min(wait, expires)
+                self._condition.wait(wait)
+            queue.pop(0)
+            self._holders[key] = (ticket, time.monotonic() + self.lease)
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                if self._holders.get(key, (None,))[0] is ticket:
+                    del self._holders[key]
+                if not queue:
+                    self._queues.pop(key, None)
+                self._condition.notify_all()
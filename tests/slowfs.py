@@ -0,0 +1,91 @@
+import errno
+import time
+from collections import Counter
+from pathlib import Path
+
+from fnum.fs import OsFilesystem
+
+
+class SlowFilesystem(OsFilesystem):
+    # Counts every call and adds a simulated latency per call, only sleeping
+    # for it when asked so CI can compare runs by syscall count and total delay
+    def __init__(
+        self, latency=0.0, latencies=None, fail=None, sleep=False, noreplace=True
+    ):
+        super().__init__()
+        self.latency = latency
+        self.latencies = latencies or {}
+        # Call name -> file names to fail with EIO
+        self.fail = fail or {}
+        self.sleep = sleep
+        # False acts like NFS, where renameat2 rejects RENAME_NOREPLACE
+        self.noreplace = noreplace
+        self.calls = Counter()
+        self.delay = 0.0
+
+    def _call(self, name, path):
+        self.calls[name] += 1
+        latency = self.latencies.get(name, self.latency)
+        self.delay += latency
+        if self.sleep and latency:
+            time.sleep(latency)
+        if Path(path).name in self.fail.get(name, ()):
+            raise OSError(errno.EIO, f"Injected {name} failure", str(path))
+
+    def reset(self):
+        self.calls.clear()
+        self.delay = 0.0
+
+    def scandir(self, dirpath):
+        self._call("scandir", dirpath)
+        return super().scandir(dirpath)
+
+    def stat(self, path):
+        self._call("stat", path)
+        return super().stat(path)
+
+    def lexists(self, path):
+        self._call("stat", path)
+        return super().lexists(path)
+
+    def rename(self, src, dst):
+        self._call("rename", src)
+        super().rename(src, dst)
+
+    def renameat2_noreplace(self, src, dst):
+        self._call("rename", src)
+        if not self.noreplace:
+            return False
+        return super().renameat2_noreplace(src, dst)
+
+    def replace(self, src, dst):
+        self._call("rename", src)
+        super().replace(src, dst)
+
+    def link(self, src, dst):
+        self._call("link", src)
+        super().link(src, dst)
+
+    def symlink(self, src, dst):
+        self._call("link", src)
+        super().symlink(src, dst)
+
+    def unlink(self, path):
+        self._call("unlink", path)
+        super().unlink(path)
+
+    def mkdir(self, path):
+        self._call("mkdir", path)
+        super().mkdir(path)
+
+    def open(self, path):
+        self._call("read", path)
+        return super().open(path)
+
+    def read_bytes(self, path):
+        self._call("read", path)
+        return super().read_bytes(path)
+
+    def write_bytes(self, path, data):
+        self._call("write", path)
+        super().write_bytes(path, data)
@@ -1,3 +1,5 @@
+import json
+import pstats
 from click.testing import CliRunner
 import pytest
 
@@ -87,3 +89,143 @@ def test_cli_fnumexception():
         result = runner.invoke(cli, [".txt,.text", str(dirpath)])
         assert result.exit_code == 1
         assert result.output != ""
+
+
+def test_cli_on_conflict():
+    runner = CliRunner()
+    test_files = ["1.txt", "1.text"]
+
+    with temp_dir(test_files) as dirpath:
+        result = runner.invoke(
+            cli, [".txt,.text", str(dirpath), "--on-conflict", "priority"]
+        )
+        assert result.exit_code == 0
+        assert_numbered_dir(
+            ["1.txt", "2.text"], dirpath, ordered=True, contents=["1", "1"]
+        )
+
+
+def test_cli_profile_and_trace():
+    runner = CliRunner()
+    test_files = ["a.jpg", "b.jpg", "a.json"]
+
+    with temp_dir(test_files) as dirpath, temp_dir([]) as outpath:
+        result = runner.invoke(
+            cli,
+            [
+                ".jpg",
+                str(dirpath),
+                "--write-metadata",
+                "--include-imeta",
+                "--profile",
+                str(outpath / "fnum.prof"),
+                "--trace",
+                str(outpath / "fnum.trace.json"),
+            ],
+        )
+        assert result.exit_code == 0
+        assert result.output == SUCCESS_OUTPUT
+
+        stats = pstats.Stats(str(outpath / "fnum.prof"))
+        assert any(func[2] == "number_files" for func in stats.stats)
+
+        trace = json.loads((outpath / "fnum.trace.json").read_text())
+        names = [event["name"] for event in trace["traceEvents"]]
+        for name in ("scan", "rename", "sidecar rename", "metadata update"):
+            assert name in names
+        assert names.count("rename") == 2
+        assert all(event["ph"] == "X" for event in trace["traceEvents"])
+
+
+def test_cli_view():
+    runner = CliRunner()
+    test_files = ["a.txt", "b.txt"]
+
+    with temp_dir(test_files) as dirpath, temp_dir([]) as viewpath:
+        result = runner.invoke(
+            cli, [".txt", str(dirpath), "--view", str(viewpath / "view")]
+        )
+        assert result.exit_code == 0
+        assert result.output == SUCCESS_OUTPUT
+        assert_numbered_dir(test_files, viewpath / "view")
+        assert FnumMax.from_file(str(viewpath / "view")).value == 2
+        assert sorted(path.name for path in dirpath.iterdir()) == test_files
+
+
+@pytest.mark.parametrize(
+    "option",
+    [
+        ["--write-max"],
+        ["--write-metadata"],
+        ["--lock"],
+        ["--lock-timeout", "1"],
+    ],
+)
+def test_cli_view_unsupported_option(option):
+    runner = CliRunner()
+
+    with temp_dir(["a.txt"]) as dirpath, temp_dir([]) as viewpath:
+        result = runner.invoke(
+            cli, [".txt", str(dirpath), "--view", str(viewpath), *option]
+        )
+        assert result.exit_code == 2
+        assert option[0] in result.output
+        assert sorted(path.name for path in viewpath.iterdir()) == []
+
+
+def test_cli_verify():
+    runner = CliRunner()
+    test_files = ["a.txt", "b.txt"]
+
+    with temp_dir(test_files) as dirpath:
+        result = runner.invoke(cli, [".txt", str(dirpath), "--write-metadata"])
+        assert result.exit_code == 0
+        (dirpath / "2.txt").unlink()
+
+        result = runner.invoke(cli, ["verify", ".txt", str(dirpath)])
+        assert result.exit_code == 1
+        assert "missing-order: 2.txt is in order but missing" in result.output
+
+        result = runner.invoke(cli, ["verify", ".txt", str(dirpath), "--repair"])
+        assert result.exit_code == 0
+        result = runner.invoke(cli, ["verify", ".txt", str(dirpath)])
+        assert result.exit_code == 0
+        assert result.output == ""
+
+
+def test_cli_query():
+    runner = CliRunner()
+    test_files = ["a.txt", "b.txt", "c.txt"]
+
+    with temp_dir(test_files) as dirpath:
+        result = runner.invoke(cli, [".txt", str(dirpath), "--write-metadata"])
+        assert result.exit_code == 0
+        originals = FnumMetadata.from_file(str(dirpath)).originals
+
+        result = runner.invoke(cli, ["lookup", str(dirpath), "2"])
+        assert result.exit_code == 0
+        original = next(key for key, value in originals.items() if value == "2.txt")
+        assert result.output == f"2\t2.txt\t{original}\n"
+
+        result = runner.invoke(cli, ["lookup", str(dirpath), "nope.txt"])
+        assert result.exit_code == 1
+
+        result = runner.invoke(cli, ["export", str(dirpath), "--range", "2-"])
+        assert result.exit_code == 0
+        rows = [json.loads(line) for line in result.output.splitlines()]
+        assert sorted(row["number"] for row in rows) == [2, 3]
+
+        result = runner.invoke(
+            cli, ["export", str(dirpath), "--format", "csv", "--range", "1"]
+        )
+        assert result.exit_code == 0
+        assert result.output.splitlines()[0] == "number,name,original"
+        assert result.output.splitlines()[1].startswith("1,1.txt,")
+
+        result = runner.invoke(cli, ["stats", str(dirpath)])
+        assert result.exit_code == 0
+        assert "max: 3\n" in result.output
+        assert "suffix .txt: 3\n" in result.output
+
+        result = runner.invoke(cli, ["stats", str(dirpath / "missing")])
+        assert result.exit_code == 1
@@ -0,0 +1,222 @@
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+
+from fnum import number_files, FileLock
+from fnum import lock as fnum_lock
+from fnum._orchestrator import _NumberOrchestrator
+from fnum.exceptions import FnumLockException
+
+from .number import make_files, temp_dir, assert_numbered_dir
+from .lockserver import LocalLockServer
+
+
+def run_threads(count, target):
+    results = [None] * count
+    errors = []
+
+    def run(index):
+        try:
+            results[index] = target(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+    return results
+
+
+def run_threads_started(count, target):
+    results = [None] * count
+
+    def run(index):
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def join_threads(threads):
+    threads, results = threads
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize("lock", [FileLock(), LocalLockServer()])
+def test_lock_success_concurrent_runs(lock):
+    test_files = [f"{chr(ord('a') + n)}.txt" for n in range(10)]
+    with temp_dir(test_files) as dirpath:
+
+        def target(index):
+            make_files([f"new{index}.txt"], dirpath)
+            return number_files(
+                dirpath, suffixes=[".txt"], write_metadata=True, lock=lock
+            )
+
+        run_threads(8, target)
+        number_files(dirpath, suffixes=[".txt"], write_metadata=True, lock=lock)
+        assert_numbered_dir(test_files + [f"new{n}.txt" for n in range(8)], dirpath)
+
+
+def call_in_thread(func):
+    outcome = []
+
+    def run():
+        try:
+            outcome.append(func())
+        except Exception as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return outcome[0]
+
+
+@pytest.mark.parametrize("lock", [FileLock(timeout=0.1), LocalLockServer(timeout=0.1)])
+def test_lock_fail_timeout(lock):
+    with temp_dir([]) as dirpath:
+        with lock.acquire(dirpath):
+            start = time.monotonic()
+            error = call_in_thread(lambda: number_files(dirpath, [".txt"], lock=lock))
+            assert isinstance(error, FnumLockException)
+            assert time.monotonic() - start >= 0.1
+
+
+def test_lock_file_holder_reported():
+    with temp_dir([]) as dirpath:
+        with FileLock().acquire(dirpath):
+            error = call_in_thread(
+                lambda: number_files(dirpath, [".txt"], lock=FileLock(timeout=0))
+            )
+            assert isinstance(error, FnumLockException)
+            assert "held by" in str(error)
+
+
+def test_local_lock_server_queues_in_order():
+    server = LocalLockServer()
+    order = []
+    with temp_dir([]) as dirpath:
+        with server.acquire(dirpath):
+
+            def target(index):
+                with server.acquire(dirpath):
+                    order.append(index)
+
+            threads = []
+            for index in range(5):
+                thread = threading.Thread(target=target, args=(index,))
+                thread.start()
+                threads.append(thread)
+                while server.queued(dirpath) < index + 1:
+                    time.sleep(0.001)
+        for thread in threads:
+            thread.join()
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_local_lock_server_lease_expires():
+    server = LocalLockServer(lease=0.05)
+    with temp_dir([]) as dirpath:
+        with server.acquire(dirpath):
+            ticket = server.holder(dirpath)
+            holders = []
+
+            def take_over():
+                with server.acquire(dirpath):
+                    holders.append(server.holder(dirpath))
+
+            call_in_thread(take_over)
+            assert holders[0] not in (None, ticket)
+        assert server.holder(dirpath) is None
+
+
+def test_lock_success_merge(monkeypatch):
+    scans = []
+    scan = _NumberOrchestrator.scan
+
+    def counting_scan(self):
+        scans.append(self.dirpath)
+        scan(self)
+
+    monkeypatch.setattr(_NumberOrchestrator, "scan", counting_scan)
+    server = LocalLockServer()
+    test_files = ["a.txt", "b.txt", "c.txt"]
+    with temp_dir(test_files) as dirpath:
+        with server.acquire(dirpath):
+
+            def target(index):
+                return number_files(dirpath, suffixes=[".txt"], lock=server, merge=True)
+
+            threads = run_threads_started(6, target)
+            while server.queued(dirpath) < 1:
+                time.sleep(0.001)
+            time.sleep(0.1)
+        results = join_threads(threads)
+
+        assert len(scans) == 1
+        assert all(result is results[0] for result in results)
+        assert_numbered_dir(test_files, dirpath)
+
+
+def test_lock_merge_fail_different_lock():
+    with temp_dir(["a.txt"]) as dirpath:
+        with FileLock().acquire(dirpath):
+            leader = run_threads_started(
+                1,
+                lambda index: number_files(
+                    dirpath, [".txt"], lock=FileLock(), merge=True
+                ),
+            )
+            while not fnum_lock._queued_runs:
+                time.sleep(0.001)
+
+            start = time.monotonic()
+            error = call_in_thread(
+                lambda: number_files(
+                    dirpath, [".txt"], lock=FileLock(timeout=0.1), merge=True
+                )
+            )
+            assert isinstance(error, FnumLockException)
+            assert time.monotonic() - start < 1
+        join_threads(leader)
+        assert_numbered_dir(["a.txt"], dirpath)
+
+
+class GateLock:
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.gate = threading.Event()
+
+    @contextmanager
+    def acquire(self, dirpath):
+        self.gate.wait()
+        yield
+
+
+def test_lock_merge_fail_follower_timeout():
+    lock = GateLock(timeout=0.1)
+    with temp_dir([]) as dirpath:
+
+        def target(index):
+            return fnum_lock._run_locked(dirpath, lambda: index, lock, "key")
+
+        leader = run_threads_started(1, target)
+        while not fnum_lock._queued_runs:
+            time.sleep(0.001)
+
+        start = time.monotonic()
+        error = call_in_thread(lambda: target(1))
+        assert isinstance(error, FnumLockException)
+        assert 0.1 <= time.monotonic() - start < 1
+
+        lock.gate.set()
+        assert join_threads(leader) == [0]
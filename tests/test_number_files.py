@@ -1,7 +1,17 @@
+import ctypes
+import errno
+import logging
+import os
 import pytest
 
 from fnum import number_files, FnumMetadata
-from fnum.exceptions import FnumException
+from fnum import _rename
+from fnum.fs import OsFilesystem
+from fnum.exceptions import (
+    FnumException,
+    FnumConflictException,
+    FnumOverwriteException,
+)
 
 from .number import make_files, temp_dir, assert_numbered_dir
 
@@ -174,3 +184,161 @@ def test_number_files_success_add_with_order():
         )
         metadata = FnumMetadata.from_file(dirpath)
         assert metadata.order == ["1.txt", "2.txt", "4.txt", "5.txt", "3.txt", "6.txt"]
+
+
+def test_number_files_fail_conflicting_files_reports_all():
+    test_files = ["1.txt", "1.text", "2.txt", "4.txt", "4.text"]
+    with temp_dir(test_files) as dirpath:
+        with pytest.raises(FnumConflictException) as excinfo:
+            number_files(dirpath, suffixes=[".txt", ".text"])
+        assert excinfo.value.conflicts == {
+            1: ("1.txt", "1.text"),
+            4: ("4.txt", "4.text"),
+        }
+        assert sorted(path.name for path in dirpath.iterdir()) == sorted(test_files)
+
+
+def test_number_files_success_conflict_priority():
+    test_files = ["1.txt", "1.text", "2.txt", "a.txt"]
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".text", ".txt"], on_conflict="priority")
+        file_order = ["1.text", "2.txt", "3.txt", "4.txt"]
+        assert_numbered_dir(
+            file_order, dirpath, ordered=True, contents=["1", "2", "a", "1"]
+        )
+
+
+def test_number_files_success_conflict_newest():
+    test_files = ["1.txt", "1.text", "2.txt"]
+    with temp_dir(test_files) as dirpath:
+        os.utime(dirpath / "1.txt", ns=(0, 0))
+        number_files(dirpath, suffixes=[".txt", ".text"], on_conflict="newest")
+        file_order = ["1.text", "2.txt", "3.txt"]
+        assert_numbered_dir(file_order, dirpath, ordered=True, contents=["1", "2", "1"])
+
+
+def test_number_files_success_conflict_append():
+    test_files = ["1.txt", "1.text", "2.txt", "a.txt"]
+    with temp_dir(test_files) as dirpath:
+        number_files(
+            dirpath,
+            suffixes=[".txt", ".text"],
+            on_conflict="append",
+            write_metadata=True,
+        )
+        file_order = ["1.txt", "2.txt", "3.txt", "4.text"]
+        assert_numbered_dir(
+            file_order, dirpath, ordered=True, contents=["2", "a", "1", "1"]
+        )
+        metadata = FnumMetadata.from_file(dirpath)
+        assert metadata.max == 4
+        assert metadata.order == ["1.txt", "2.txt", "3.txt", "4.text"]
+        assert metadata.originals == {
+            "2.txt": "1.txt",
+            "a.txt": "2.txt",
+            "1.txt": "3.txt",
+            "1.text": "4.text",
+        }
+
+
+def test_number_files_fail_stash_taken():
+    test_files = ["1.txt", ".fnum-1.txt"]
+    with temp_dir(test_files) as dirpath:
+        with pytest.raises(FnumException):
+            number_files(dirpath, suffixes=[".txt"])
+        assert sorted(path.name for path in dirpath.iterdir()) == sorted(test_files)
+
+
+def test_number_files_result():
+    test_files = ["1.txt", "2.txt", "3.txt"]
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        (dirpath / "2.txt").unlink()
+        make_files(["new.txt"], dirpath)
+
+        result = number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        assert result.renames == [("3.txt", "2.txt"), ("new.txt", "3.txt")]
+        assert result.added == ["3.txt"]
+        assert result.removed == ["2.txt"]
+        assert result.max == 3
+        assert result.changed
+        assert dict(result.metadata) == dict(FnumMetadata.from_file(dirpath))
+
+        result = number_files(dirpath, suffixes=[".txt"])
+        assert not result.changed
+        assert result.max == 3
+
+
+def test_number_files_fail_overwrites_reports_all():
+    test_files = [f"{num}.txt" for num in range(1, 9)]
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        metadata = FnumMetadata.from_file(dirpath)
+        metadata.order.remove("3.txt")
+        metadata.order.remove("6.txt")
+        metadata.to_file(dirpath)
+        (dirpath / "2.txt").unlink()
+
+        with pytest.raises(FnumOverwriteException) as excinfo:
+            number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        assert excinfo.value.overwrites == [
+            ("5.txt", "3.txt"),
+            ("8.txt", "5.txt"),
+            ("3.txt", "6.txt"),
+        ]
+        assert sorted(path.name for path in dirpath.glob("*.txt")) == sorted(
+            test_files[:1] + test_files[2:]
+        )
+
+
+def test_rename_noreplace(fs=None):
+    fs = fs or OsFilesystem()
+    with temp_dir(["a.txt", "b.txt"]) as dirpath:
+        with pytest.raises(FileExistsError):
+            fs.rename_noreplace(dirpath / "a.txt", dirpath / "b.txt")
+        assert (dirpath / "b.txt").read_text() == "b"
+
+        fs.rename_noreplace(dirpath / "a.txt", dirpath / "c.txt")
+        assert (dirpath / "c.txt").read_text() == "a"
+
+
+def test_rename_noreplace_unsupported(monkeypatch, caplog):
+    calls = []
+
+    def renameat2(*args):
+        calls.append(args)
+        ctypes.set_errno(errno.EINVAL)
+        return -1
+
+    monkeypatch.setattr(_rename, "_renameat2", renameat2)
+    fs = OsFilesystem()
+    with caplog.at_level(logging.WARNING, logger="fnum._rename"):
+        test_rename_noreplace(fs)
+        with temp_dir(["a.txt"]) as dirpath:
+            fs.rename_noreplace(dirpath / "a.txt", dirpath / "b.txt")
+            fs.rename_noreplace(dirpath / "b.txt", dirpath / "c.txt")
+            assert (dirpath / "c.txt").read_text() == "a"
+    # Only tried and warned about once for each directory
+    assert len(calls) == 2
+    assert len(caplog.records) == 2
+
+
+def test_number_files_success_unmoved_files():
+    test_files = ["1.txt", "2.txt", "3.txt", "4.txt", "5.txt"]
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        metadata = FnumMetadata.from_file(dirpath)
+        metadata.order = ["1.txt", "5.txt"]
+        metadata.to_file(dirpath)
+        (dirpath / "2.txt").unlink()
+
+        result = number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        assert result.renames == [("5.txt", "2.txt")]
+        assert_numbered_dir(
+            ["1.txt", "2.txt", "3.txt", "4.txt"],
+            dirpath,
+            ordered=True,
+            contents=["1", "5", "3", "4"],
+        )
+        metadata = FnumMetadata.from_file(dirpath)
+        assert metadata.order == ["1.txt", "2.txt", "3.txt", "4.txt"]
@@ -0,0 +1,124 @@
+import pytest
+import yaml
+
+from fnum import (
+    number_files,
+    iter_entries,
+    lookup_entries,
+    get_stats,
+    FnumMetadata,
+)
+from fnum.exceptions import FnumException
+
+from .number import temp_dir
+from .slowfs import SlowFilesystem
+
+
+TEST_DATA = {
+    "order": ["1.txt", "2.txt", "3.jpg", "4.txt"],
+    "originals": {
+        "a.txt": "1.txt",
+        "b.txt": "2.txt",
+        "<Imagé *>.jpg": "3.jpg",
+        "4.txt": "4.txt",
+    },
+    "max": 4,
+    "extra": {"nested": [1, 2, {"order": ["x"]}]},
+}
+
+
+def write_data(dirpath, data):
+    (dirpath / "fnum.metadata.yaml").write_text(
+        yaml.safe_dump(data, allow_unicode=True)
+    )
+
+
+def test_iter_file_matches_from_file():
+    with temp_dir([]) as dirpath:
+        write_data(dirpath, TEST_DATA)
+        fields = list(FnumMetadata.iter_file(dirpath))
+        metadata = FnumMetadata.from_file(dirpath)
+        assert [value for field, value in fields if field == "max"] == [metadata.max]
+        assert [value for field, value in fields if field == "order"] == metadata.order
+        assert (
+            dict(value for field, value in fields if field == "originals")
+            == metadata.originals
+        )
+
+
+def test_iter_file_empty_max():
+    with temp_dir([]) as dirpath:
+        number_files(dirpath, [".txt"], write_metadata=True)
+        assert list(FnumMetadata.iter_file(dirpath)) == [("max", 0)]
+        write_data(dirpath, {})
+        assert list(FnumMetadata.iter_file(dirpath)) == []
+
+
+def test_iter_file_fail_newer_version():
+    with temp_dir([]) as dirpath:
+        FnumMetadata(dict(TEST_DATA, version=99)).to_file(dirpath)
+        metadata_str = (dirpath / "fnum.metadata.yaml").read_text()
+        assert metadata_str.startswith("version: 99\n")
+        entries = FnumMetadata.iter_file(dirpath)
+        with pytest.raises(FnumException, match="version 99"):
+            next(entries)
+        with pytest.raises(FnumException):
+            next(iter_entries(dirpath))
+        with pytest.raises(FnumException):
+            next(lookup_entries(dirpath, ["1"]))
+
+
+def test_iter_file_fail_older_version(monkeypatch):
+    monkeypatch.setattr(FnumMetadata, "VERSION", 2)
+    with temp_dir([]) as dirpath:
+        write_data(dirpath, TEST_DATA)
+        with pytest.raises(FnumException, match="verify --repair"):
+            next(FnumMetadata.iter_file(dirpath))
+
+
+def test_iter_entries_range():
+    with temp_dir([]) as dirpath:
+        write_data(dirpath, TEST_DATA)
+        assert sorted(iter_entries(dirpath, 2, 3)) == [
+            (2, "2.txt", "b.txt"),
+            (3, "3.jpg", "<Imagé *>.jpg"),
+        ]
+        assert sorted(iter_entries(dirpath, start=4)) == [(4, "4.txt", "4.txt")]
+        assert len(list(iter_entries(dirpath))) == 4
+
+
+def test_iter_entries_streams():
+    fs = SlowFilesystem()
+    with temp_dir([]) as dirpath:
+        write_data(dirpath, TEST_DATA)
+        entries = iter_entries(dirpath, fs=fs)
+        assert next(entries)[0] == 4
+        assert fs.calls == {"read": 1}
+
+
+def test_lookup_entries():
+    with temp_dir([]) as dirpath:
+        write_data(dirpath, TEST_DATA)
+        assert sorted(lookup_entries(dirpath, ["1", "2.txt", "<Imagé *>.jpg"])) == [
+            (1, "1.txt", "a.txt"),
+            (2, "2.txt", "b.txt"),
+            (3, "3.jpg", "<Imagé *>.jpg"),
+        ]
+        assert list(lookup_entries(dirpath, ["nope"])) == []
+
+
+def test_get_stats():
+    with temp_dir([]) as dirpath:
+        write_data(dirpath, TEST_DATA)
+        stats = get_stats(dirpath)
+        assert stats == {
+            "max": 4,
+            "order": 4,
+            "entries": 4,
+            "first": 1,
+            "last": 4,
+            "renamed": 3,
+            "suffixes": {".txt": 3, ".jpg": 1},
+        }
+        stats = get_stats(dirpath, 2, 3)
+        assert (stats["order"], stats["entries"]) == (2, 2)
@@ -0,0 +1,88 @@
+import os
+import pytest
+
+from fnum import number_files, NumberSession, FnumMetadata
+from fnum.exceptions import FnumException
+
+from .number import make_files, temp_dir, assert_numbered_dir
+
+
+def test_session_success_multiple_runs():
+    test_files = ["a.txt", "b.txt", "c.txt"]
+    with temp_dir(test_files) as dirpath, NumberSession() as session:
+        session.number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        assert dirpath in session
+        assert_numbered_dir(test_files, dirpath)
+
+        make_files(["d.txt", "e.txt"], dirpath)
+        result = session.number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        assert_numbered_dir(["d.txt", "e.txt"], dirpath, start=4)
+        assert result.max == 5
+        assert dict(result.metadata) == dict(FnumMetadata.from_file(dirpath))
+
+
+def test_session_success_uses_cache():
+    test_files = ["a.txt", "b.txt"]
+    with temp_dir(test_files) as dirpath, NumberSession() as session:
+        session.number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        stat = dirpath.stat()
+
+        # A change the directory mtime doesn't reveal is only seen after refresh
+        make_files(["c.txt"], dirpath)
+        os.utime(dirpath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        result = session.number_files(dirpath, suffixes=[".txt"])
+        assert not result.changed
+
+        session.refresh(dirpath)
+        assert dirpath not in session
+        result = session.number_files(dirpath, suffixes=[".txt"])
+        assert result.renames == [("c.txt", "3.txt")]
+
+
+def test_session_success_revalidates():
+    test_files = ["a.txt", "b.txt"]
+    with temp_dir(test_files) as dirpath, NumberSession() as session:
+        session.number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        (dirpath / "1.txt").unlink()
+
+        result = session.number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        assert result.renames == [("2.txt", "1.txt")]
+        assert result.removed == ["1.txt"]
+        assert FnumMetadata.from_file(dirpath).order == ["1.txt"]
+
+
+def test_session_success_matches_number_files():
+    def run(numberer, dirpath):
+        make_files(["a.txt", "b.txt"], dirpath)
+        numberer(dirpath, suffixes=[".txt"], write_metadata=True)
+        make_files(["c.txt"], dirpath)
+        numberer(dirpath, suffixes=[".txt"])
+        make_files(["d.txt"], dirpath)
+        return numberer(dirpath, suffixes=[".txt"], write_metadata=True)
+
+    with temp_dir([]) as dirpath, temp_dir([]) as session_dirpath:
+        with NumberSession() as session:
+            session_result = run(session.number_files, session_dirpath)
+        result = run(number_files, dirpath)
+        assert dict(session_result.metadata) == dict(result.metadata)
+        assert session_result.renames == result.renames
+
+
+def test_session_lru():
+    with temp_dir([]) as dirpath, NumberSession(maxsize=2) as session:
+        for name in ("a", "b", "c"):
+            (dirpath / name).mkdir()
+            session.number_files(dirpath / name, suffixes=[".txt"])
+        assert len(session) == 2
+        assert dirpath / "a" not in session
+        assert dirpath / "c" in session
+
+
+def test_session_fail_closed():
+    with temp_dir([]) as dirpath:
+        session = NumberSession()
+        session.number_files(dirpath, suffixes=[".txt"])
+        session.close()
+        assert len(session) == 0
+        with pytest.raises(FnumException):
+            session.number_files(dirpath, suffixes=[".txt"])
@@ -0,0 +1,167 @@
+import pytest
+
+from fnum import number_files, view_files, NumberSession, FnumMetadata
+
+from .number import make_files, temp_dir, assert_numbered_dir
+from .slowfs import SlowFilesystem
+
+
+FILE_COUNT = 500
+
+
+def make_test_files(count, suffix=".jpg"):
+    return [f"file{n}{suffix}" for n in range(count)]
+
+
+def test_slowfs_new_files():
+    test_files = make_test_files(FILE_COUNT)
+    sidecars = make_test_files(FILE_COUNT, ".json")
+    fs = SlowFilesystem(latency=0.001)
+    with temp_dir(test_files + sidecars) as dirpath:
+        number_files(
+            dirpath,
+            suffixes=[".jpg"],
+            write_metadata=True,
+            write_max=True,
+            include_imeta=True,
+            fs=fs,
+        )
+        assert_numbered_dir(test_files, dirpath, with_imeta=True)
+        assert fs.calls == {
+            "scandir": 1,
+            "read": 1,
+            "rename": 2 * FILE_COUNT,
+            "write": 2,
+        }
+        assert fs.delay == pytest.approx(0.001 * sum(fs.calls.values()))
+
+
+def test_slowfs_numbered_files():
+    test_files = make_test_files(FILE_COUNT)
+    fs = SlowFilesystem()
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".jpg"], write_metadata=True)
+        (dirpath / "1.jpg").unlink()
+        make_files(["new.jpg"], dirpath)
+
+        number_files(dirpath, suffixes=[".jpg"], write_metadata=True, fs=fs)
+        assert fs.calls == {"scandir": 1, "read": 1, "rename": FILE_COUNT, "write": 1}
+
+        fs.reset()
+        number_files(dirpath, suffixes=[".jpg"], write_metadata=True, fs=fs)
+        assert fs.calls == {"scandir": 1, "read": 1, "write": 1}
+
+
+def test_slowfs_noreplace_unsupported():
+    test_files = make_test_files(FILE_COUNT)
+    fs = SlowFilesystem(noreplace=False)
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".jpg"], fs=fs)
+        assert_numbered_dir(test_files, dirpath)
+        # One failed renameat2, then a check and a rename for each file
+        assert fs.calls == {
+            "scandir": 1,
+            "read": 1,
+            "rename": FILE_COUNT + 1,
+            "stat": FILE_COUNT,
+        }
+
+
+def test_slowfs_session():
+    test_files = make_test_files(FILE_COUNT)
+    fs = SlowFilesystem()
+    with temp_dir(test_files) as dirpath, NumberSession(fs=fs) as session:
+        session.number_files(dirpath, suffixes=[".jpg"], write_metadata=True)
+
+        fs.reset()
+        session.number_files(dirpath, suffixes=[".jpg"], write_metadata=True)
+        assert fs.calls == {"stat": 4, "write": 1}
+
+
+def test_slowfs_session_without_metadata():
+    test_files = make_test_files(FILE_COUNT)
+    fs = SlowFilesystem()
+    with temp_dir(test_files) as dirpath, NumberSession(fs=fs) as session:
+        session.number_files(dirpath, suffixes=[".jpg"])
+
+        fs.reset()
+        session.number_files(dirpath, suffixes=[".jpg"])
+        assert fs.calls == {"stat": 4}
+
+
+def test_slowfs_view():
+    test_files = make_test_files(FILE_COUNT)
+    fs = SlowFilesystem()
+    with temp_dir(test_files) as dirpath, temp_dir([]) as viewpath:
+        view_files(dirpath, viewpath, [".jpg"], fs=fs)
+        assert fs.calls["link"] == FILE_COUNT
+
+        fs.reset()
+        (dirpath / "file0.jpg").unlink()
+        view_files(dirpath, viewpath, [".jpg"], fs=fs)
+        # Numbers stay contiguous like number_files keeps them, so every
+        # later link moves down one
+        assert fs.calls["link"] == FILE_COUNT - 1
+        assert fs.calls["unlink"] == 1
+
+        fs.reset()
+        view_files(dirpath, viewpath, [".jpg"], fs=fs)
+        assert "link" not in fs.calls
+        assert "write" not in fs.calls
+
+
+def test_slowfs_rename_failure():
+    test_files = ["a.jpg", "b.jpg", "c.jpg"]
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".jpg"], write_metadata=True)
+        (dirpath / "1.jpg").unlink()
+        before = FnumMetadata.from_file(dirpath)
+
+        fs = SlowFilesystem(fail={"rename": {"3.jpg"}})
+        with pytest.raises(OSError):
+            number_files(dirpath, suffixes=[".jpg"], write_metadata=True, fs=fs)
+        assert dict(FnumMetadata.from_file(dirpath)) == dict(before)
+        assert sorted(path.name for path in dirpath.glob("*.jpg")) == ["1.jpg", "3.jpg"]
+
+
+@pytest.mark.parametrize("on_conflict", ["priority", "append"])
+def test_slowfs_rename_failure_after_stash(on_conflict):
+    test_files = ["1.txt", "1.text", "a.txt"]
+    with temp_dir(test_files) as dirpath:
+        fs = SlowFilesystem(fail={"rename": {"a.txt"}})
+        with pytest.raises(OSError):
+            number_files(
+                dirpath,
+                suffixes=[".txt", ".text"],
+                write_metadata=True,
+                on_conflict=on_conflict,
+                fs=fs,
+            )
+        assert ".fnum-1.text" in [path.name for path in dirpath.iterdir()]
+
+        number_files(
+            dirpath,
+            suffixes=[".txt", ".text"],
+            write_metadata=True,
+            on_conflict=on_conflict,
+        )
+        with temp_dir(test_files) as expected:
+            number_files(
+                expected,
+                suffixes=[".txt", ".text"],
+                write_metadata=True,
+                on_conflict=on_conflict,
+            )
+            assert sorted(path.name for path in dirpath.iterdir()) == sorted(
+                path.name for path in expected.iterdir()
+            )
+            for path in expected.iterdir():
+                assert (dirpath / path.name).read_text() == path.read_text()
+
+
+def test_slowfs_scan_failure():
+    fs = SlowFilesystem(fail={"scandir": {"missing"}})
+    with temp_dir([]) as dirpath:
+        with pytest.raises(OSError):
+            number_files(dirpath / "missing", suffixes=[".jpg"], fs=fs)
+        assert fs.calls["scandir"] == 1
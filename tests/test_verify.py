@@ -0,0 +1,114 @@
+import pytest
+import yaml
+
+from fnum import number_files, verify_metadata, repair_metadata, FnumMetadata, FnumMax
+from fnum.exceptions import FnumException
+
+from .number import make_files, temp_dir
+
+
+def original_of(metadata, name):
+    return next(key for key, value in metadata.originals.items() if value == name)
+
+
+def break_metadata(dirpath):
+    metadata = FnumMetadata.from_file(dirpath)
+    metadata.order = ["1.txt", "2.txt", "1.txt", "9.txt", "4.txt"]
+    metadata.originals["z.txt"] = "9.txt"
+    metadata.originals["y.txt"] = "1.txt"
+    del metadata.originals[original_of(metadata, "3.txt")]
+    metadata.max = 7
+    metadata.to_file(dirpath)
+
+
+def test_verify_success_clean():
+    test_files = ["a.txt", "b.txt", "c.txt"]
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".txt"], write_metadata=True, write_max=True)
+        assert verify_metadata(dirpath, [".txt"]) == []
+
+
+def test_verify_reports_all():
+    test_files = ["a.txt", "b.txt", "c.txt", "d.txt"]
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".txt"], write_metadata=True, write_max=True)
+        break_metadata(dirpath)
+        before = (dirpath / "fnum.metadata.yaml").read_text()
+
+        issues = verify_metadata(dirpath, [".txt"])
+        assert [(issue.kind, issue.name) for issue in issues] == [
+            ("duplicate-order", "1.txt"),
+            ("missing-order", "9.txt"),
+            ("unordered", "3.txt"),
+            ("duplicate-original", "y.txt"),
+            ("orphaned-original", "z.txt"),
+            ("unmapped", "3.txt"),
+            ("max", "max"),
+        ]
+        assert (dirpath / "fnum.metadata.yaml").read_text() == before
+
+
+def test_repair_success():
+    test_files = ["a.txt", "b.txt", "c.txt", "d.txt"]
+    with temp_dir(test_files) as dirpath:
+        number_files(dirpath, suffixes=[".txt"], write_metadata=True, write_max=True)
+        originals = FnumMetadata.from_file(dirpath).originals
+        del originals[original_of(FnumMetadata.from_file(dirpath), "3.txt")]
+        originals["3.txt"] = "3.txt"
+        break_metadata(dirpath)
+        FnumMax(2).to_file(dirpath)
+
+        issues = repair_metadata(dirpath, [".txt"])
+        assert issues[-1].kind == "max-file"
+        metadata = FnumMetadata.from_file(dirpath)
+        assert metadata.order == ["1.txt", "2.txt", "4.txt", "3.txt"]
+        assert metadata.originals == {
+            **{
+                original: name
+                for original, name in originals.items()
+                if original != "c.txt"
+            },
+            "3.txt": "3.txt",
+        }
+        assert metadata.max == 4
+        assert FnumMax.from_file(dirpath).value == 4
+        assert verify_metadata(dirpath, [".txt"]) == []
+
+
+def test_verify_unrepairable():
+    test_files = ["1.txt", "2.txt", "2.text", "4.txt"]
+    with temp_dir([]) as dirpath:
+        number_files(dirpath, suffixes=[".txt"], write_metadata=True)
+        make_files(test_files, dirpath)
+        issues = repair_metadata(dirpath, [".txt", ".text"])
+        assert [(issue.kind, issue.repairable) for issue in issues[:2]] == [
+            ("conflict", False),
+            ("gap", False),
+        ]
+        assert FnumMetadata.from_file(dirpath).max == 2
+
+
+def test_verify_invalid_fields():
+    with temp_dir(["1.txt"]) as dirpath:
+        (dirpath / "fnum.metadata.yaml").write_text(yaml.safe_dump({"order": "1.txt"}))
+        issues = repair_metadata(dirpath, [".txt"])
+        assert ("invalid", "order") in [(issue.kind, issue.name) for issue in issues]
+        metadata = FnumMetadata.from_file(dirpath)
+        assert metadata.order == ["1.txt"]
+        assert metadata.originals == {"1.txt": "1.txt"}
+
+
+def test_metadata_migrate(monkeypatch):
+    def rename_order(metadata):
+        metadata.order = [name.upper() for name in metadata.order]
+
+    monkeypatch.setattr(FnumMetadata, "VERSION", 2)
+    monkeypatch.setattr(FnumMetadata, "_MIGRATIONS", {1: rename_order})
+    metadata = FnumMetadata.from_str(yaml.safe_dump({"order": ["a.txt"]}))
+    assert metadata.order == ["A.TXT"]
+    assert dict(metadata)["version"] == 2
+
+
+def test_metadata_fail_newer_version():
+    with pytest.raises(FnumException):
+        FnumMetadata.from_str(yaml.safe_dump({"order": [], "version": 99}))
@@ -0,0 +1,159 @@
+from pathlib import Path
+import pytest
+
+from fnum import number_files, view_files, FnumMetadata, FnumMax
+from fnum.exceptions import FnumException, FnumConflictException
+
+from .number import make_files, temp_dir, assert_numbered_dir
+
+
+def assert_view(viewpath, contents, mode="hardlink"):
+    names = sorted(
+        path.name for path in viewpath.iterdir() if not path.name.startswith("fnum.")
+    )
+    assert names == sorted(contents.keys())
+    for name, data in contents.items():
+        assert (viewpath / name).read_text() == data
+        assert (viewpath / name).is_symlink() == (mode == "symlink")
+
+
+@pytest.mark.parametrize("mode", ["hardlink", "symlink"])
+def test_view_files_success(mode):
+    test_files = ["a.txt", "b.text", "c.txt", "ignored.md"]
+    with temp_dir(test_files) as dirpath, temp_dir([]) as viewpath:
+        result = view_files(dirpath, viewpath, [".txt", ".text"], mode=mode)
+        assert_view(viewpath, {"1.txt": "a", "2.text": "b", "3.txt": "c"}, mode)
+        assert sorted(path.name for path in dirpath.iterdir()) == sorted(test_files)
+        assert result.added == ["1.txt", "2.text", "3.txt"]
+
+        metadata = FnumMetadata.from_file(viewpath)
+        assert metadata.originals == {
+            "a.txt": "1.txt",
+            "b.text": "2.text",
+            "c.txt": "3.txt",
+        }
+        assert metadata.order == ["1.txt", "2.text", "3.txt"]
+        assert FnumMax.from_file(viewpath).value == 3
+
+
+@pytest.mark.parametrize("mode", ["hardlink", "symlink"])
+def test_view_files_success_incremental(mode):
+    test_files = ["a.txt", "b.txt", "c.txt", "d.txt"]
+    with temp_dir(test_files) as dirpath, temp_dir([]) as viewpath:
+        view_files(dirpath, viewpath, [".txt"], mode=mode)
+        metadata_mtime = (viewpath / "fnum.metadata.yaml").stat().st_mtime_ns
+        inode = (viewpath / "1.txt").lstat().st_ino
+
+        result = view_files(dirpath, viewpath, [".txt"], mode=mode)
+        assert result.renames == []
+        assert (viewpath / "fnum.metadata.yaml").stat().st_mtime_ns == metadata_mtime
+
+        (dirpath / "b.txt").unlink()
+        make_files(["e.txt"], dirpath)
+        result = view_files(dirpath, viewpath, [".txt"], mode=mode)
+        assert result.removed == ["2.txt"]
+        assert result.added == ["4.txt"]
+        assert result.renames == [
+            ("c.txt", "2.txt"),
+            ("d.txt", "3.txt"),
+            ("e.txt", "4.txt"),
+        ]
+        assert (viewpath / "1.txt").lstat().st_ino == inode
+        assert_view(
+            viewpath, {"1.txt": "a", "2.txt": "c", "3.txt": "d", "4.txt": "e"}, mode
+        )
+
+        (dirpath / "e.txt").unlink()
+        result = view_files(dirpath, viewpath, [".txt"], mode=mode)
+        assert result.renames == []
+        assert_view(viewpath, {"1.txt": "a", "2.txt": "c", "3.txt": "d"}, mode)
+        assert FnumMax.from_file(viewpath).value == 3
+
+
+@pytest.mark.parametrize("mode", ["hardlink", "symlink"])
+def test_view_files_success_leftover_temp(mode):
+    test_files = ["a.txt", "b.txt"]
+    with temp_dir(test_files) as dirpath, temp_dir([]) as viewpath:
+        (viewpath / ".fnum-1.txt").write_text("stale")
+        (viewpath / ".fnum-2.txt").symlink_to("missing.txt")
+        view_files(dirpath, viewpath, [".txt"], mode=mode)
+        assert_view(viewpath, {"1.txt": "a", "2.txt": "b"}, mode)
+
+
+def assert_view_matches_number_files(dirpath, viewpath, suffixes, **kwargs):
+    with temp_dir([]) as numberpath:
+        for path in dirpath.iterdir():
+            (numberpath / path.name).write_bytes(path.read_bytes())
+        number_files(numberpath, suffixes, write_metadata=True, **kwargs)
+        numbered = {
+            path.name: path.read_text()
+            for path in numberpath.iterdir()
+            if Path(path.name).suffix in suffixes
+        }
+        assert_view(viewpath, numbered)
+        assert (
+            FnumMetadata.from_file(viewpath).order
+            == FnumMetadata.from_file(numberpath).order
+        )
+
+
+def test_view_files_success_numbered_source():
+    test_files = ["1.txt", "2.txt", "10.txt", "b.txt"]
+    with temp_dir(test_files) as dirpath, temp_dir([]) as viewpath:
+        view_files(dirpath, viewpath, [".txt"])
+        assert_view(viewpath, {"1.txt": "1", "2.txt": "2", "3.txt": "10", "4.txt": "b"})
+        assert_view_matches_number_files(dirpath, viewpath, [".txt"])
+
+
+def test_view_files_success_source_metadata():
+    with temp_dir(["a.txt", "b.txt", "c.txt"]) as dirpath, temp_dir([]) as viewpath:
+        number_files(dirpath, [".txt"], write_metadata=True)
+        metadata = FnumMetadata.from_file(dirpath)
+        metadata.order = ["3.txt", "2.txt", "1.txt"]
+        metadata.to_file(dirpath)
+        (dirpath / "2.txt").unlink()
+
+        view_files(dirpath, viewpath, [".txt"])
+        assert_view_matches_number_files(dirpath, viewpath, [".txt"])
+
+
+@pytest.mark.parametrize("on_conflict", ["priority", "append"])
+def test_view_files_success_conflict(on_conflict):
+    test_files = ["1.txt", "1.text", "2.txt", "a.txt"]
+    with temp_dir(test_files) as dirpath, temp_dir([]) as viewpath:
+        view_files(dirpath, viewpath, [".txt", ".text"], on_conflict=on_conflict)
+        assert_view_matches_number_files(
+            dirpath, viewpath, [".txt", ".text"], on_conflict=on_conflict
+        )
+
+
+def test_view_files_fail_conflict():
+    with temp_dir(["1.txt", "1.text"]) as dirpath, temp_dir([]) as viewpath:
+        with pytest.raises(FnumConflictException):
+            view_files(dirpath, viewpath, [".txt", ".text"])
+
+
+def test_view_files_success_new_file_named_like_link():
+    with temp_dir(["a.txt", "b.txt"]) as dirpath, temp_dir([]) as viewpath:
+        view_files(dirpath, viewpath, [".txt"])
+        make_files(["2.txt"], dirpath)
+        result = view_files(dirpath, viewpath, [".txt"])
+        assert result.added == ["3.txt"]
+        assert_view(viewpath, {"1.txt": "a", "2.txt": "b", "3.txt": "2"})
+
+
+def test_view_files_success_with_imeta():
+    test_files = ["a.jpg", "b.jpg", "a.json", "b.json"]
+    with temp_dir(test_files) as dirpath, temp_dir([]) as viewpath:
+        view_files(dirpath, viewpath, [".jpg"], include_imeta=True)
+        assert_numbered_dir(["a.jpg", "b.jpg"], viewpath, ordered=True, with_imeta=True)
+
+        (dirpath / "a.jpg").unlink()
+        view_files(dirpath, viewpath, [".jpg"], include_imeta=True)
+        assert_view(viewpath, {"1.jpg": "b", "1.json": "b"})
+
+
+def test_view_files_fail_same_directory():
+    with temp_dir(["a.txt"]) as dirpath:
+        with pytest.raises(FnumException):
+            view_files(dirpath, dirpath, [".txt"])